@@ -0,0 +1,707 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+import json
+from datetime import date
+from flask import Blueprint, Response, request, url_for, abort, current_app
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.exceptions import HTTPException
+from forms import VenueForm, ArtistForm
+from models import db, City, Venue, Artist, Show, Series, venue_genre, artist_genre
+import queries
+from search import search
+from cities import get_city
+from genres import get_genres, refresh_genre_counts
+from pagination import keyset_paginate
+from cache import cache, SHOW_TAGS, show_side, show_cache_tags, venue_cache_tags, artist_cache_tags
+from counters import record_show, recount
+from importer import form_data, validate_entities, write_entities, validate_shows, insert_shows, booking_errors
+from series import validate_series, expand, horizon, reschedule, cancel, series_cache_tags
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#
+# /api/v1 mirrors the html routes: list, detail, search and create/edit of
+# venues and artists, list and create of shows. Every read is a column
+# projection of only the fields asked for with ?fields=a,b, joining city,
+# venue or artist only when one of their fields is selected. Lists page
+# with the same ?after= / ?before= cursors as the html listings, and cache
+# the encoded body under the same tags.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def json_default(value):
+    # Dates and datetimes as ISO 8601
+    return value.isoformat()
+
+def dumps(data):
+    # orjson when installed, it encodes datetimes natively and much faster
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=json_default, separators=(',', ':'))
+
+def respond(body, status=200, headers=None):
+    # body is data, or an already encoded (cached) payload
+    if not isinstance(body, (bytes, str)):
+        body = dumps(body)
+    return Response(body, status=status, headers=headers, mimetype='application/json')
+
+@api.errorhandler(HTTPException)
+def http_error(error):
+    if error.response is not None:
+        return error.response
+    return respond({'error': error.name, 'message': error.description}, error.code)
+
+# The app's html 404 and 500 pages are registered by code, which wins over
+# a handler registered by class
+api.register_error_handler(404, http_error)
+api.register_error_handler(500, http_error)
+
+#  Fields
+#  ----------------------------------------------------------------
+
+def venue_fields():
+    return {
+        'id': Venue.id,
+        'name': Venue.name,
+        'city': City.city,
+        'state': City.state,
+        'address': Venue.address,
+        'phone': Venue.phone,
+        'genres': queries.genre_list(venue_genre, venue_genre.c.venueid, Venue.id),
+        'facebook_link': Venue.facebook_link,
+        'website_link': Venue.website,
+        'image_link': Venue.image_link,
+        'seeking_talent': Venue.seeking_talent,
+        'seeking_description': Venue.seeking_description,
+        'upcoming_shows_count': Venue.upcoming_shows_count,
+        'past_shows_count': Venue.past_shows_count,
+        'version': Venue.version,
+    }
+
+def artist_fields():
+    return {
+        'id': Artist.id,
+        'name': Artist.name,
+        'city': City.city,
+        'state': City.state,
+        'phone': Artist.phone,
+        'genres': queries.genre_list(artist_genre, artist_genre.c.artistid, Artist.id),
+        'facebook_link': Artist.facebook_link,
+        'website_link': Artist.website,
+        'image_link': Artist.image_link,
+        'seeking_venue': Artist.seeking_venue,
+        'seeking_description': Artist.seeking_description,
+        'upcoming_shows_count': Artist.upcoming_shows_count,
+        'past_shows_count': Artist.past_shows_count,
+        'version': Artist.version,
+    }
+
+def show_fields():
+    return {
+        'id': Show.id,
+        'start_time': Show.start_time,
+        'end_time': Show.end_time,
+        'series_id': Show.seriesid,
+        'venue_id': Show.venueid,
+        'venue_name': Venue.name,
+        'venue_image_link': Venue.image_link,
+        'artist_id': Show.artistid,
+        'artist_name': Artist.name,
+        'artist_image_link': Artist.image_link,
+    }
+
+# Form field -> column written by a PATCH, city and state resolve to cityid
+VENUE_COLUMNS = {
+    'name': 'name',
+    'address': 'address',
+    'phone': 'phone',
+    'website_link': 'website',
+    'facebook_link': 'facebook_link',
+    'seeking_talent': 'seeking_talent',
+    'seeking_description': 'seeking_description',
+    'image_link': 'image_link',
+}
+ARTIST_COLUMNS = {
+    'name': 'name',
+    'phone': 'phone',
+    'website_link': 'website',
+    'facebook_link': 'facebook_link',
+    'seeking_venue': 'seeking_venue',
+    'seeking_description': 'seeking_description',
+    'image_link': 'image_link',
+}
+
+# Tables joined in when any of their fields is selected
+VENUE_JOINS = [({'city', 'state'}, City, City.id == Venue.cityid)]
+ARTIST_JOINS = [({'city', 'state'}, City, City.id == Artist.cityid)]
+SHOW_JOINS = [
+    ({'venue_name', 'venue_image_link'}, Venue, Venue.id == Show.venueid),
+    ({'artist_name', 'artist_image_link'}, Artist, Artist.id == Show.artistid),
+]
+
+VENUE_LIST_FIELDS = ['id', 'name', 'city', 'state', 'upcoming_shows_count']
+ARTIST_LIST_FIELDS = ['id', 'name']
+SHOW_LIST_FIELDS = ['id', 'start_time', 'end_time', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link']
+
+# Fields a series is created and edited with
+SERIES_FIELDS = {'venue_id', 'artist_id', 'start_time', 'duration_minutes', 'rrule'}
+
+def selected_fields(fields, default):
+    # Names from ?fields=, 400 on any the resource doesn't have
+    names = request.args.get('fields')
+    if not names:
+        return list(default)
+    names = list(dict.fromkeys(name.strip() for name in names.split(',') if name.strip()))
+    unknown = [name for name in names if name not in fields]
+    if unknown or not names:
+        abort(400, 'Unknown fields: ' + ', '.join(unknown) if unknown else 'No fields selected')
+    return names
+
+def project(model, fields, joins, names, keys=(), need=()):
+    # Query of the named fields, plus sort keys the client didn't ask for,
+    # with only the joins those fields (or filters in need) require
+    columns = names + [key for key in keys if key not in names]
+    query = db.session.query(*[fields[name].label(name) for name in columns]).select_from(model)
+    used = set(columns) | set(need)
+    for join_fields, target, onclause in joins:
+        if join_fields & used:
+            query = query.join(target, onclause)
+    return query
+
+def as_json(row, names):
+    data = {name: getattr(row, name) for name in names}
+    if 'genres' in data:
+        data['genres'] = data['genres'].split(',') if data['genres'] else []
+    return data
+
+def page_size():
+    # ?limit= up to the html listing page size
+    per_page = current_app.config['LISTING_PER_PAGE']
+    return min(max(request.args.get('limit', per_page, type=int), 1), per_page)
+
+def listing(query, columns, names):
+    rows, pager = keyset_paginate(query, columns, page_size())
+    return {'data': [as_json(row, names) for row in rows], **pager}
+
+def cache_args():
+    return tuple(sorted(request.args.items(multi=True)))
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+def list_venues():
+    def load():
+        fields = venue_fields()
+        names = selected_fields(fields, VENUE_LIST_FIELDS)
+        query = project(Venue, fields, VENUE_JOINS, names, keys=['id'])
+        return dumps(listing(query, [Venue.id], names))
+
+    return respond(cache.get_or_set('api_venues', cache_args(), ['venues', *SHOW_TAGS], load, dated=True))
+
+@api.route('/venues/<int:venue_id>')
+def get_venue(venue_id):
+    def load():
+        fields = venue_fields()
+        names = selected_fields(fields, fields)
+        row = project(Venue, fields, VENUE_JOINS, names).filter(Venue.id == venue_id).first()
+        if row is None:
+            abort(404)
+        return dumps(as_json(row, names))
+
+    return respond(cache.get_or_set('api_venue', (venue_id, cache_args()), [f'venue:{venue_id}'], load, dated=True))
+
+@api.route('/venues/<int:venue_id>/shows')
+def list_venue_shows(venue_id):
+    return show_list(Show.venueid == venue_id, [f'venue:{venue_id}'])
+
+@api.route('/venues/search')
+def search_venues():
+    return search_results(Venue)
+
+@api.route('/venues', methods=['POST'])
+def create_venue():
+    form = validated(VenueForm)
+    venue = Venue()
+    apply_venue_form(venue, form)
+    db.session.add(venue)
+    db.session.flush()
+    refresh_genre_counts([genre.id for genre in venue.genres])
+    db.session.commit()
+    cache.invalidate('venues')
+    return created(get_venue(venue.id), url_for('api.get_venue', venue_id=venue.id))
+
+@api.route('/venues/<int:venue_id>', methods=['PUT'])
+def edit_venue(venue_id):
+    venue = queries.venue_profile().get_or_404(venue_id)
+    form = validated(VenueForm)
+    check_version(venue)
+    old_genreids = [genre.id for genre in venue.genres]
+    old_cityid = venue.cityid
+    try:
+        apply_venue_form(venue, form) # Autoflushes, so may already be stale
+        db.session.flush()
+        refresh_genre_counts(old_genreids + [genre.id for genre in venue.genres])
+        tags = venue_cache_tags(venue_id) + [f'city:{old_cityid}']
+        db.session.commit()
+    except StaleDataError:
+        stale(Venue, venue_id)
+    cache.invalidate(*tags)
+    return get_venue(venue_id)
+
+@api.route('/venues/<int:venue_id>', methods=['PATCH'])
+def patch_venue(venue_id):
+    return patch(Venue, VenueForm, VENUE_COLUMNS, venue_genre.c.venueid, venue_id, venue_cache_tags, get_venue)
+
+@api.route('/venues/batch', methods=['POST'])
+def batch_venues():
+    return batch('venues')
+
+def apply_venue_form(venue, form):
+    # Same fields as the html create and edit pages
+    venue.name = form.name.data
+    venue.address = form.address.data
+    venue.cityid = get_city(form.city.data, form.state.data)
+    venue.phone = form.phone.data
+    venue.website = form.website_link.data
+    venue.facebook_link = form.facebook_link.data
+    venue.genres = get_genres(form.genres.data)
+    venue.seeking_talent = form.seeking_talent.data
+    venue.seeking_description = form.seeking_description.data
+    venue.image_link = form.image_link.data
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@api.route('/artists')
+def list_artists():
+    def load():
+        fields = artist_fields()
+        names = selected_fields(fields, ARTIST_LIST_FIELDS)
+        query = project(Artist, fields, ARTIST_JOINS, names, keys=['id'])
+        return dumps(listing(query, [Artist.id], names))
+
+    return respond(cache.get_or_set('api_artists', cache_args(), ['artists', *SHOW_TAGS], load, dated=True))
+
+@api.route('/artists/<int:artist_id>')
+def get_artist(artist_id):
+    def load():
+        fields = artist_fields()
+        names = selected_fields(fields, fields)
+        row = project(Artist, fields, ARTIST_JOINS, names).filter(Artist.id == artist_id).first()
+        if row is None:
+            abort(404)
+        return dumps(as_json(row, names))
+
+    return respond(cache.get_or_set('api_artist', (artist_id, cache_args()), [f'artist:{artist_id}'], load, dated=True))
+
+@api.route('/artists/<int:artist_id>/shows')
+def list_artist_shows(artist_id):
+    return show_list(Show.artistid == artist_id, [f'artist:{artist_id}'])
+
+@api.route('/artists/search')
+def search_artists():
+    return search_results(Artist)
+
+@api.route('/artists', methods=['POST'])
+def create_artist():
+    form = validated(ArtistForm)
+    artist = Artist()
+    apply_artist_form(artist, form)
+    db.session.add(artist)
+    db.session.flush()
+    refresh_genre_counts([genre.id for genre in artist.genres])
+    db.session.commit()
+    cache.invalidate('artists')
+    return created(get_artist(artist.id), url_for('api.get_artist', artist_id=artist.id))
+
+@api.route('/artists/<int:artist_id>', methods=['PUT'])
+def edit_artist(artist_id):
+    artist = queries.artist_profile().get_or_404(artist_id)
+    form = validated(ArtistForm)
+    check_version(artist)
+    old_genreids = [genre.id for genre in artist.genres]
+    try:
+        apply_artist_form(artist, form) # Autoflushes, so may already be stale
+        db.session.flush()
+        refresh_genre_counts(old_genreids + [genre.id for genre in artist.genres])
+        tags = artist_cache_tags(artist_id)
+        db.session.commit()
+    except StaleDataError:
+        stale(Artist, artist_id)
+    cache.invalidate(*tags)
+    return get_artist(artist_id)
+
+@api.route('/artists/<int:artist_id>', methods=['PATCH'])
+def patch_artist(artist_id):
+    return patch(Artist, ArtistForm, ARTIST_COLUMNS, artist_genre.c.artistid, artist_id, artist_cache_tags, get_artist)
+
+@api.route('/artists/batch', methods=['POST'])
+def batch_artists():
+    return batch('artists')
+
+def apply_artist_form(artist, form):
+    # Same fields as the html create and edit pages
+    artist.name = form.name.data
+    artist.cityid = get_city(form.city.data, form.state.data)
+    artist.phone = form.phone.data
+    artist.website = form.website_link.data
+    artist.facebook_link = form.facebook_link.data
+    artist.genres = get_genres(form.genres.data)
+    artist.seeking_venue = form.seeking_venue.data
+    artist.seeking_description = form.seeking_description.data
+    artist.image_link = form.image_link.data
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@api.route('/shows')
+def list_shows():
+    # Upcoming shows, or from/to (YYYY-MM-DD, inclusive) at venues in ?city=
+    return show_list(None, SHOW_TAGS)
+
+def show_list(scope, tags):
+    # Shows in start time order: a venue's or artist's (scope) upcoming or
+    # ?when=past shows, or the filtered shows listing when scope is None
+    def load():
+        fields = show_fields()
+        names = selected_fields(fields, SHOW_LIST_FIELDS)
+        today = date.today()
+        city_name, _, state_code = request.args.get('city', '').partition(',')
+        need = {'venue_name'} if city_name.strip() else ()
+        query = project(Show, fields, SHOW_JOINS, names, keys=['start_time', 'id'], need=need)
+
+        if scope is not None:
+            query = query.filter(scope)
+            if request.args.get('when') == 'past':
+                query = query.filter(Show.start_time <= today)
+            else:
+                query = query.filter(Show.start_time > today)
+        else:
+            start = parse_date(request.args.get('from'))
+            end = parse_date(request.args.get('to'))
+            query = query.filter(Show.start_time >= start if start else Show.start_time > today)
+            if end:
+                query = query.filter(Show.start_time < date.fromordinal(end.toordinal() + 1))
+            if city_name.strip():
+                query = query.join(City, City.id == Venue.cityid).filter(City.city == city_name.strip())
+                if state_code.strip():
+                    query = query.filter(City.state == state_code.strip())
+        return dumps(listing(query, [Show.start_time, Show.id], names))
+
+    return respond(cache.get_or_set('api_shows', (request.view_args, cache_args()), tags, load, dated=True))
+
+@api.route('/shows', methods=['POST'])
+def create_show():
+    errors = {}
+    valid = validate_shows([(0, json_body())], lambda number, row_errors: errors.update(row_errors))
+    if errors:
+        abort(unprocessable(errors))
+
+    show = Show(**valid[0][1])
+    db.session.add(show)
+    try:
+        db.session.flush()
+    except IntegrityError as error:
+        db.session.rollback()
+        errors = booking_errors(error)
+        if errors is None:
+            raise
+        abort(respond({'error': 'Conflict', 'fields': errors}, 409))
+    record_show(show.venueid, show.artistid, show.start_time) # Keep show counters in step
+    tags = show_cache_tags([show.venueid], [show.artistid], [show_side(show.start_time)])
+    db.session.commit()
+    cache.invalidate(*tags)
+    return respond({
+        'id': show.id,
+        'start_time': show.start_time,
+        'end_time': show.end_time,
+        'venue_id': show.venueid,
+        'artist_id': show.artistid
+    }, 201)
+
+@api.route('/shows/batch', methods=['POST'])
+def batch_shows():
+    return batch('shows')
+
+#  Series
+#  ----------------------------------------------------------------
+
+def series_json(series):
+    return {
+        'id': series.id,
+        'venue_id': series.venueid,
+        'artist_id': series.artistid,
+        'rrule': series.rrule,
+        'start_time': series.dtstart,
+        'duration_minutes': series.duration_minutes,
+        'expanded_until': series.expanded_until,
+        'cancelled': series.cancelled,
+    }
+
+def schedule_json(series, inserted, skipped, **counts):
+    # The series, with the shows an expansion created and skipped
+    return {
+        **series_json(series),
+        'created': len(inserted),
+        **counts,
+        'skipped': [{'start_time': show['start_time'], 'fields': errors} for show, errors in skipped],
+    }
+
+@api.route('/series/<int:series_id>')
+def get_series(series_id):
+    return respond(series_json(Series.query.get_or_404(series_id)))
+
+@api.route('/series', methods=['POST'])
+def create_series():
+    # Expanded up to the window right away; occurrences that would double
+    # book are skipped and listed
+    values, errors = validate_series(json_body())
+    if errors:
+        abort(unprocessable(errors))
+    series = Series(**values, expanded_until=values['dtstart'])
+    db.session.add(series)
+    db.session.flush()
+    inserted, skipped = expand([series], horizon())
+    tags = series_cache_tags(series)
+    db.session.commit()
+    cache.invalidate(*tags)
+    response = respond(schedule_json(series, inserted, skipped), 201)
+    response.headers['Location'] = url_for('api.get_series', series_id=series.id)
+    return response
+
+@api.route('/series/<int:series_id>', methods=['PATCH'])
+def patch_series(series_id):
+    # Any of venue_id, artist_id, start_time, duration_minutes and rrule;
+    # the shows still to come are replaced, past ones are left alone
+    series = Series.query.with_for_update().get_or_404(series_id)
+    if series.cancelled:
+        abort(409, 'Series is cancelled')
+    data = json_body()
+    unknown = [name for name in data if name not in SERIES_FIELDS]
+    if unknown:
+        abort(unprocessable({name: ['Unknown field'] for name in unknown}))
+    row = {
+        'venue_id': series.venueid,
+        'artist_id': series.artistid,
+        'start_time': series.dtstart.isoformat(),
+        'duration_minutes': series.duration_minutes,
+        'rrule': series.rrule,
+        **data
+    }
+    values, errors = validate_series(row)
+    if errors:
+        abort(unprocessable(errors))
+    venueid, artistid = series.venueid, series.artistid
+    deleted, inserted, skipped = reschedule(series, values)
+    # Shows moved off the old venue and artist as well as onto the new ones
+    tags = show_cache_tags({venueid, series.venueid}, {artistid, series.artistid}, ['shows:upcoming'])
+    db.session.commit()
+    cache.invalidate(*tags)
+    return respond(schedule_json(series, inserted, skipped, deleted=deleted))
+
+@api.route('/series/<int:series_id>', methods=['DELETE'])
+def cancel_series(series_id):
+    # Cancels the shows still to come; past shows stay
+    series = Series.query.with_for_update().get_or_404(series_id)
+    deleted = cancel(series)
+    tags = series_cache_tags(series)
+    db.session.commit()
+    cache.invalidate(*tags)
+    return respond({**series_json(series), 'deleted': deleted})
+
+#  Batch Create
+#  ----------------------------------------------------------------
+
+def batch(kind):
+    # Create a JSON array of items in one transaction, all or nothing: every
+    # item is validated first (shows check their venues and artists in one
+    # query each), then all are written with one bulk insert per table.
+    # Results line up with the items: 201 with the new id, or 422 with errors
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        abort(400, 'Expected a JSON array')
+    if len(items) > current_app.config['API_BATCH_SIZE']:
+        abort(413, f'At most {current_app.config["API_BATCH_SIZE"]} items per batch')
+
+    results = [{'status': 201} for item in items]
+    def reject(index, errors):
+        results[index] = {'status': 422, 'fields': errors}
+    def double_booked(index, errors):
+        results[index] = {'status': 409, 'fields': errors}
+    rows = [(index, item if isinstance(item, dict) else None) for index, item in enumerate(items)]
+
+    if kind == 'shows':
+        valid = validate_shows(rows, reject)
+    else:
+        valid = validate_entities(kind, rows, reject)
+    if kind == 'shows' and len(valid) == len(items):
+        # Overlaps with existing shows, or each other
+        shows = insert_shows(valid, double_booked, ids=True)
+    if len(valid) < len(items) or kind == 'shows' and len(shows) < len(items):
+        db.session.rollback()
+        for result in results:
+            if result['status'] == 201:
+                result['status'] = 424 # Valid, but not created because others failed
+        return respond({'created': 0, 'results': results}, 422)
+    if not items:
+        return respond({'created': 0, 'results': []}, 201)
+
+    if kind == 'shows':
+        venue_ids = {show['venueid'] for show in shows}
+        artist_ids = {show['artistid'] for show in shows}
+        recount(venue_ids, artist_ids)
+        tags = show_cache_tags(venue_ids, artist_ids, {show_side(show['start_time']) for show in shows})
+        created_rows = shows
+    else:
+        created_rows = write_entities(kind, valid)
+        refresh_genre_counts([genre.id for genre in get_genres({name for _, _, genres, _ in valid for name in genres})])
+        tags = [kind]
+    db.session.commit()
+    cache.invalidate(*tags)
+
+    for (index, *_), row in zip(valid, created_rows):
+        results[index]['id'] = row['id']
+    return respond({'created': len(created_rows), 'results': results}, 201)
+
+#  Helpers
+#  ----------------------------------------------------------------
+
+def parse_date(value):
+    # YYYY-MM-DD query argument as a date, 400 if malformed
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        abort(400, f'Bad date {value}, expected YYYY-MM-DD')
+
+def search_results(model):
+    # Ranked name search, ?q= and ?page=
+    term = request.args.get('q', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = current_app.config['SEARCH_RESULTS_PER_PAGE']
+    count, results = search(model, term, page=page, per_page=per_page)
+    return respond({
+        'count': count,
+        'data': [{'id': result.id, 'name': result.name} for result in results],
+        'prev': url_for(request.endpoint, q=term, page=page - 1) if page > 1 else None,
+        'next': url_for(request.endpoint, q=term, page=page + 1) if page * per_page < count else None
+    })
+
+def json_body():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, 'Expected a JSON object')
+    return data
+
+def validated(form_class):
+    # Form for the JSON body, under the html forms' rules; 422 with field errors
+    form = form_class(formdata=form_data(json_body()), meta={'csrf': False})
+    if not form.validate():
+        abort(unprocessable({field: messages for field, messages in form.errors.items() if messages}))
+    return form
+
+def expected_version(data):
+    # Version the client last read: the body's version or If-Match: "<version>"
+    version = data.get('version')
+    if version is None and request.if_match:
+        tags = request.if_match.as_set()
+        version = next(iter(tags)) if len(tags) == 1 else None
+    if version is None:
+        return None
+    try:
+        return int(version)
+    except (TypeError, ValueError):
+        abort(400, 'version must be an integer')
+
+def conflict(current):
+    abort(respond({
+        'error': 'Conflict',
+        'message': f'Edited since version was read, current version is {current}',
+        'version': current
+    }, 409))
+
+def stale(model, entity_id):
+    # An update that lost to a concurrent edit: rolled back, 409 with the
+    # current version, or 404 if the entity was deleted meanwhile
+    db.session.rollback()
+    current = db.session.query(model.version).filter(model.id == entity_id).scalar()
+    if current is None:
+        abort(404)
+    conflict(current)
+
+def check_version(entity):
+    # Optional for PUT, a stale version is a 409 instead of an overwrite
+    version = expected_version(json_body())
+    if version is not None and version != entity.version:
+        conflict(entity.version)
+
+def patch(model, form_class, columns, link_column, entity_id, cache_tags, detail):
+    # Partial update as one UPDATE of the sent columns, guarded by version:
+    # UPDATE ... SET ..., version = version + 1 WHERE id = :id AND version = :version
+    data = json_body()
+    version = expected_version(data)
+    if version is None:
+        abort(428, 'PATCH needs the version last read, in the body or If-Match')
+    fields = [name for name in data if name != 'version']
+
+    # Validate only the sent fields, by the html form's rules
+    form = form_class(formdata=form_data(data), meta={'csrf': False})
+    errors = {}
+    for name in fields:
+        if name not in form or name == 'csrf_token':
+            errors[name] = ['Unknown field']
+        elif not form[name].validate(form):
+            errors[name] = form[name].errors
+    if ('city' in data) != ('state' in data):
+        errors['city' if 'city' not in data else 'state'] = ['city and state are changed together']
+    if errors:
+        abort(unprocessable(errors))
+
+    table = model.__table__
+    values = {columns[name]: form[name].data for name in fields if name in columns}
+    old_cityid = None
+    if 'city' in data:
+        values['cityid'] = get_city(form.city.data, form.state.data)
+        old_cityid = db.session.query(model.cityid).filter(model.id == entity_id).scalar()
+    values['version'] = table.c.version + 1
+    result = db.session.execute(
+        table.update().where(table.c.id == entity_id, table.c.version == version).values(values)
+    )
+    if result.rowcount == 0:
+        stale(model, entity_id)
+
+    if 'genres' in data:
+        # Genre links replaced as sets, no entity load
+        link_table = link_column.table
+        old_genreids = [genreid for genreid, in db.session.query(link_table.c.genreid).filter(link_column == entity_id)]
+        genreids = [genre.id for genre in get_genres(form.genres.data)]
+        db.session.execute(link_table.delete().where(link_column == entity_id))
+        if genreids:
+            db.session.execute(link_table.insert(), [{link_column.key: entity_id, 'genreid': genreid} for genreid in genreids])
+        refresh_genre_counts(old_genreids + genreids)
+
+    tags = cache_tags(entity_id)
+    if old_cityid is not None:
+        tags.append(f'city:{old_cityid}') # Its shows leave that city's listings
+    db.session.commit()
+    cache.invalidate(*tags)
+    return detail(entity_id)
+
+def unprocessable(errors):
+    return respond({'error': 'Unprocessable Entity', 'fields': errors}, 422)
+
+def created(response, location):
+    response.status_code = 201
+    response.headers['Location'] = location
+    return response
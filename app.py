@@ -13,7 +13,8 @@ from flask import (
     flash,
     redirect,
     url_for,
-    abort
+    abort,
+    stream_with_context
 )
 from flask_moment import Moment
 import logging
@@ -21,8 +22,28 @@ from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
-from datetime import date
-from models import db, City, Venue, Artist, Show
+from datetime import date, timedelta
+from itertools import groupby
+from models import db, Venue, Artist, Show, venue_genre, artist_genre
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+import queries
+from search import search
+from cities import get_city, city_cache
+from pagination import keyset_paginate
+from conditional import conditional
+from viewmodels import ShowSummary, CityVenues, VenueSummary, VenueDetail, ArtistSummary, ArtistDetail
+from cache import cache, cached_page, cache_cli, show_side, show_cache_tags, venue_cache_tags, artist_cache_tags
+from genres import get_genres, refresh_genre_counts
+import instrumentation
+import replicas
+from replicas import replicas_cli
+import database
+from database import pool_cli
+from counters import record_show, counters_cli
+from series import series_cli
+from importer import import_cli, show_values, booking_errors
+from exporter import export_cli, export_chunks, EXPORTS, FORMATS
+from api import api
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -32,7 +53,20 @@ app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
 db.init_app(app) # Init db
+database.init_app(app) # Refuse to start without secret or database
+city_cache.maxsize = app.config['CITY_CACHE_SIZE']
+cache.init_app(app) # Init query cache
+replicas.init_app(app) # Read replica routing, ahead of query stats
+instrumentation.init_app(app) # Per request query stats
 migrate = Migrate(app, db)
+app.cli.add_command(counters_cli)
+app.cli.add_command(series_cli)
+app.cli.add_command(import_cli)
+app.cli.add_command(export_cli)
+app.cli.add_command(cache_cli)
+app.cli.add_command(replicas_cli)
+app.cli.add_command(pool_cli)
+app.register_blueprint(api) # JSON API under /api/v1
 
 #----------------------------------------------------------------------------#
 # Filters.
@@ -53,21 +87,42 @@ app.jinja_env.filters['datetime'] = format_datetime
 
 
 #----------------------------------------------------------------------------#
-# Get City Id.
+# Pagination.
 #----------------------------------------------------------------------------#
 
-def get_city(city_name, state_code):
-    # Check db for existing city, state
-    city = City.query.filter_by(city=city_name, state=state_code)
-    if city.count(): # Check if city already exists
-        return city[0].id
-    else: # Else create new city entry in db
-        city_id = ''
-        new_city = City(city=city_name, state=state_code)
-        db.session.add(new_city)
-        db.session.flush()
-        city_id = new_city.id
-        return city_id
+def page_url(page_arg, page):
+    # Build url to current page with one page argument changed
+    args = request.args.to_dict()
+    args[page_arg] = page
+    return url_for(request.endpoint, **request.view_args, **args)
+
+def paginate_shows(query, count, page_arg):
+    # Fetch one page of a show list, page number taken from request args
+    per_page = app.config['SHOWS_PER_PAGE']
+    page = max(request.args.get(page_arg, 1, type=int), 1)
+    shows = query.limit(per_page).offset((page - 1) * per_page).all()
+    pager = {
+        "prev": page_url(page_arg, page - 1) if page > 1 else None,
+        "next": page_url(page_arg, page + 1) if page * per_page < count else None
+    }
+    return shows, pager
+
+def parse_date(value):
+    # YYYY-MM-DD query argument as a date, 400 if malformed
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        abort(400)
+
+def search_pager(search_term, page, count):
+    # Prev/next links for a page of search results
+    per_page = app.config['SEARCH_RESULTS_PER_PAGE']
+    return {
+        "prev": url_for(request.endpoint, search_term=search_term, page=page - 1) if page > 1 else None,
+        "next": url_for(request.endpoint, search_term=search_term, page=page + 1) if page * per_page < count else None
+    }
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -82,86 +137,75 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@cached_page
+@conditional(queries.venue_listing_stamps, dated=True)
 def venues():
-  cities = City.query.all();
-  data=[]
-  today = date.today()
-  for city in cities:
-      citydata = {
-        "city": city.city,
-        "state": city.state,
-        "venues": []
-      }
-      venues = Venue.query.filter_by(cityid=city.id).all()
-      for venue in venues:
-          venue = {
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": Show.query.filter(Show.venueid==venue.id, Show.start_time>today).count()
-          }
-          citydata['venues'].append(venue)
-      data.append(citydata)
-
-  return render_template('pages/venues.html', areas=data)
-
-@app.route('/venues/search', methods=['POST'])
+  def load():
+      # One row per venue with its city and stored upcoming show count, no show table
+      query = queries.venue_listing()
+      # Page through venues in (city, venue) order
+      rows, pager = keyset_paginate(query, [Venue.cityid, Venue.id], app.config['LISTING_PER_PAGE'])
+
+      # Group venue rows by city, state
+      data = [
+          CityVenues(city=city, state=state, venues=tuple(VenueSummary.from_row(venue) for venue in city_venues))
+          for (cityid, city, state), city_venues in groupby(rows, key=lambda row: (row.cityid, row.city, row.state))
+      ]
+      return data, pager
+
+  data, pager = cache.get_or_set(
+      'venues', (request.args.get('after'), request.args.get('before')),
+      ['venues'], load, dated=True
+  )
+  return render_template('pages/venues.html', areas=data, pager=pager)
+
+@app.route('/venues/search', methods=['GET', 'POST'])
 def search_venues():
-    search_term = '%' + request.form.get('search_term') + '%'
-    results = Venue.query.filter(Venue.name.ilike(search_term)).all() # Use ilike query as case insensitive
+    search_term = request.values.get('search_term', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    count, results = search(
+        Venue, search_term,
+        page=page,
+        per_page=app.config['SEARCH_RESULTS_PER_PAGE'],
+        count_only=bool(request.values.get('count_only'))
+    ) # Indexed, ranked search
     response={
-      "count": len(results),
-      "data": []
+      "count": count,
+      "data": [{"id": result.id, "name": result.name} for result in results],
+      "pager": search_pager(search_term, page, count)
     }
-    for result in results:
-        artist = {
-          "id": result.id,
-          "name": result.name
-        }
-        response['data'].append(artist)
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+    return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 @app.route('/venues/<int:venue_id>')
+@cached_page
+@conditional(queries.venue_stamps, dated=True)
 def show_venue(venue_id):
-    past_shows = []
-    upcoming_shows = []
-    venue = Venue.query.get_or_404(venue_id) # Get current venue
-    shows = db.session.query(Show).join(Venue, Venue.id == Show.venueid).all() # Use join statement
-    today = date.today() # Get current date
-
-    # Loop over shows
-    for show in shows:
-        temp_show = {
-            "artist_id": show.artist.id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": show.start_time
-        }
-        # Filter into correct list by date
-        if show.start_time.date() > today:
-            upcoming_shows.append(temp_show)
-        else:
-            past_shows.append(temp_show)
-
-    # object class to dict
-    data = vars(venue)
-
-    # Add city data
-    city = venue.city
-    data['city'] = city.city
-    data['state'] = city.state
-
-    # Add genres in correct format
-    genres = []
-    if isinstance(venue.genres, str):
-        genres = venue.genres.split(',')
-    data['genres'] = genres
-
-    # Add extra shows data
-    data['past_shows'] = past_shows
-    data['upcoming_shows'] = upcoming_shows
-    data['past_shows_count'] = len(past_shows)
-    data['upcoming_shows_count'] = len(upcoming_shows)
+    def load():
+        row = queries.venue_detail(venue_id).first() # Get current venue
+        if row is None:
+            abort(404)
+        today = date.today() # Get current date
+
+        # Only this venue's shows, split by date in db
+        past_query, upcoming_query = queries.venue_shows(venue_id, today)
+        past_shows, past_pager = paginate_shows(past_query, row.past_shows_count, 'past_page')
+        upcoming_shows, upcoming_pager = paginate_shows(upcoming_query, row.upcoming_shows_count, 'upcoming_page')
+
+        # Counts come from the stored counters on the row
+        data = VenueDetail.from_row(
+            row,
+            genres=tuple(name for name, in queries.venue_genre_names(venue_id)),
+            past_shows=tuple(ShowSummary.from_row(show) for show in past_shows),
+            upcoming_shows=tuple(ShowSummary.from_row(show) for show in upcoming_shows),
+            past_shows_pager=past_pager,
+            upcoming_shows_pager=upcoming_pager
+        )
+        return data
 
+    data = cache.get_or_set(
+        'venue', (venue_id, request.args.get('past_page', 1, type=int), request.args.get('upcoming_page', 1, type=int)),
+        [f'venue:{venue_id}'], load, dated=True
+    )
     return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
@@ -186,8 +230,7 @@ def create_venue_submission():
         cityid = get_city(city_name, state_code)
         # EO Check db for submitted city, state
         # Generate genre list
-        genres = request.form.getlist('genres') # Fetch list from form
-        genres =  ",".join(genres) # Convert to comma separated string to store in db
+        genres = get_genres(request.form.getlist('genres')) # Fetch list from form
         # EO Generate genre list
         venue = Venue(
             name=request.form.get('name'),
@@ -204,7 +247,10 @@ def create_venue_submission():
         error = False
         try:
             db.session.add(venue)
+            db.session.flush()
+            refresh_genre_counts([genre.id for genre in venue.genres])
             db.session.commit()
+            cache.invalidate('venues')
         except:
             error = True
             db.session.rollback()
@@ -225,9 +271,14 @@ def create_venue_submission():
 def delete_venue(venue_id):
   error = False
   try:
-      venue = Venue.query.get(venue_id)
+      venue = queries.venue_profile().get(venue_id)
+      genreids = [genre.id for genre in venue.genres]
+      tags = venue_cache_tags(venue_id)
       db.session.delete(venue)
+      db.session.flush()
+      refresh_genre_counts(genreids)
       db.session.commit()
+      cache.invalidate(*tags)
   except:
       error = True
       db.session.rollback()
@@ -241,75 +292,74 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@cached_page
+@conditional(queries.artist_listing_stamps)
 def artists():
-  data = Artist.query.with_entities(Artist.id, Artist.name)
-  return render_template('pages/artists.html', artists=data)
-
-@app.route('/artists/search', methods=['POST'])
+  def load():
+      query = queries.artist_listing()
+      rows, pager = keyset_paginate(query, [Artist.id], app.config['LISTING_PER_PAGE'])
+      return [ArtistSummary.from_row(row) for row in rows], pager
+
+  data, pager = cache.get_or_set(
+      'artists', (request.args.get('after'), request.args.get('before')),
+      ['artists'], load
+  )
+  return render_template('pages/artists.html', artists=data, pager=pager)
+
+@app.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
-    search_term = '%' + request.form.get('search_term') + '%'
-    results = Artist.query.filter(Artist.name.ilike(search_term)).all() # Use ilike query as case insensitive
+    search_term = request.values.get('search_term', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    count, results = search(
+        Artist, search_term,
+        page=page,
+        per_page=app.config['SEARCH_RESULTS_PER_PAGE'],
+        count_only=bool(request.values.get('count_only'))
+    ) # Indexed, ranked search
     response={
-      "count": len(results),
-      "data": []
+      "count": count,
+      "data": [{"id": result.id, "name": result.name} for result in results],
+      "pager": search_pager(search_term, page, count)
     }
-    for result in results:
-        artist = {
-          "id": result.id,
-          "name": result.name
-        }
-        response['data'].append(artist)
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+    return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 @app.route('/artists/<int:artist_id>')
+@cached_page
+@conditional(queries.artist_stamps, dated=True)
 def show_artist(artist_id):
-    artist = Artist.query.get_or_404(artist_id) # Get current artist
-    shows = db.session.query(Show).join(Artist, Artist.id == Show.artistid).all() # Use join statement
-    today = date.today() # Get current date
-    past_shows = []
-    upcoming_shows = []
-
-    # Loop over shows
-    for show in shows:
-        temp_show = {
-            "venue_id": show.artist.id,
-            "venue_name": show.artist.name,
-            "venue_image_link": show.artist.image_link,
-            "start_time": show.start_time
-        }
-        # Filter into correct list by date
-        if show.start_time.date() > today:
-            upcoming_shows.append(temp_show)
-        else:
-            past_shows.append(temp_show)
-
-    # object class to dict
-    data = vars(artist)
-
-    # Add city data
-    city = artist.city
-    data['city'] = city.city
-    data['state'] = city.state
-
-    # Add genres in correct format
-    genres = []
-    if isinstance(artist.genres, str):
-        genres = artist.genres.split(',')
-    data['genres'] = genres
-
-    # Add extra shows data
-    data['past_shows'] = past_shows
-    data['upcoming_shows'] = upcoming_shows
-    data['past_shows_count'] = len(past_shows)
-    data['upcoming_shows_count'] = len(upcoming_shows)
+    def load():
+        row = queries.artist_detail(artist_id).first() # Get current artist
+        if row is None:
+            abort(404)
+        today = date.today() # Get current date
+
+        # Only this artist's shows, split by date in db
+        past_query, upcoming_query = queries.artist_shows(artist_id, today)
+        past_shows, past_pager = paginate_shows(past_query, row.past_shows_count, 'past_page')
+        upcoming_shows, upcoming_pager = paginate_shows(upcoming_query, row.upcoming_shows_count, 'upcoming_page')
+
+        # Counts come from the stored counters on the row
+        data = ArtistDetail.from_row(
+            row,
+            genres=tuple(name for name, in queries.artist_genre_names(artist_id)),
+            past_shows=tuple(ShowSummary.from_row(show) for show in past_shows),
+            upcoming_shows=tuple(ShowSummary.from_row(show) for show in upcoming_shows),
+            past_shows_pager=past_pager,
+            upcoming_shows_pager=upcoming_pager
+        )
+        return data
 
+    data = cache.get_or_set(
+        'artist', (artist_id, request.args.get('past_page', 1, type=int), request.args.get('upcoming_page', 1, type=int)),
+        [f'artist:{artist_id}'], load, dated=True
+    )
     return render_template('pages/show_artist.html', artist=data)
 
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-  artist = Artist.query.get_or_404(artist_id)
+  artist = queries.artist_profile().get_or_404(artist_id)
 
   form = ArtistForm(obj=artist)
 
@@ -320,7 +370,7 @@ def edit_artist(artist_id):
   form.phone.data = artist.phone
   form.website_link.data = artist.website
   form.facebook_link.data = artist.facebook_link
-  form.genres.data = artist.genres
+  form.genres.data = [genre.name for genre in artist.genres]
   form.seeking_venue.data = artist.seeking_venue
   form.seeking_description.data = artist.seeking_description
   form.image_link.data = artist.image_link
@@ -333,14 +383,13 @@ def edit_artist_submission(artist_id):
     # Get form object
     form = ArtistForm(request.form)
     # Get artist
-    artist = Artist.query.get(artist_id)
+    artist = queries.artist_profile().get(artist_id)
 
     # Check form validation
     if form.validate():
         error = False
         # Generate genre list
-        genres = request.form.getlist('genres') # Fetch list from form
-        genres =  ",".join(genres) # Convert to comma separated string to store in db
+        genres = get_genres(request.form.getlist('genres')) # Fetch list from form
         # EO Generate genre list
         try:
             # Check db for submitted city, state
@@ -353,13 +402,18 @@ def edit_artist_submission(artist_id):
             artist.cityid = cityid
             artist.phone = request.form.get('phone')
             artist.website = request.form.get('website_link')
+            old_genreids = [genre.id for genre in artist.genres]
             artist.genres = genres
             artist.facebook_link = request.form.get('facebook_link')
             artist.seeking_venue = bool(request.form.get('seeking_venue')) # bool() to convert into boolean SQLAlchemy likes...
             artist.seeking_description = request.form.get('seeking_description')
             artist.image_link = request.form.get('image_link')
             # EO Update fields
+            db.session.flush()
+            refresh_genre_counts(old_genreids + [genre.id for genre in genres])
+            tags = artist_cache_tags(artist_id)
             db.session.commit()
+            cache.invalidate(*tags)
         except:
             error = True
             db.session.rollback()
@@ -379,7 +433,7 @@ def edit_artist_submission(artist_id):
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    venue = Venue.query.get_or_404(venue_id)
+    venue = queries.venue_profile().get_or_404(venue_id)
     form = VenueForm()
     # Populate form with db data
     form.name.data = venue.name
@@ -389,7 +443,7 @@ def edit_venue(venue_id):
     form.phone.data = venue.phone
     form.website_link.data = venue.website
     form.facebook_link.data = venue.facebook_link
-    form.genres.data = venue.genres
+    form.genres.data = [genre.name for genre in venue.genres]
     form.seeking_talent.data = venue.seeking_talent
     form.seeking_description.data = venue.seeking_description
     form.image_link.data = venue.image_link
@@ -402,14 +456,13 @@ def edit_venue_submission(venue_id):
     # Get form object
     form = VenueForm(request.form)
     # Get venue
-    venue = Venue.query.get(venue_id)
+    venue = queries.venue_profile().get(venue_id)
 
     # Check form validation
     if form.validate():
         error = False
         # Generate genre list
-        genres = request.form.getlist('genres') # Fetch list from form
-        genres =  ",".join(genres) # Convert to comma separated string to store in db
+        genres = get_genres(request.form.getlist('genres')) # Fetch list from form
         # EO Generate genre list
         try:
             # Check db for submitted city, state
@@ -418,18 +471,24 @@ def edit_venue_submission(venue_id):
             cityid = get_city(city_name, state_code)
             # EO Check db for submitted city, state
             # Update fields
+            old_cityid = venue.cityid # Its shows leave that city's listings
             venue.name = request.form.get('name')
             venue.address = request.form.get('address')
             venue.cityid = cityid
             venue.phone = request.form.get('phone')
             venue.website = request.form.get('website_link')
             venue.facebook_link = request.form.get('facebook_link')
+            old_genreids = [genre.id for genre in venue.genres]
             venue.genres = genres
             venue.seeking_talent = bool(request.form.get('seeking_talent')) # bool() to convert into boolean SQLAlchemy likes...
             venue.seeking_description = request.form.get('seeking_description')
             venue.image_link = request.form.get('image_link')
             # EO Update fields
+            db.session.flush()
+            refresh_genre_counts(old_genreids + [genre.id for genre in genres])
+            tags = venue_cache_tags(venue_id) + [f'city:{old_cityid}']
             db.session.commit()
+            cache.invalidate(*tags)
         except:
             error = True
             db.session.rollback()
@@ -468,8 +527,7 @@ def create_artist_submission():
         cityid = get_city(city_name, state_code)
         # EO Check db for submitted city, state
         # Generate genre list
-        genres = request.form.getlist('genres') # Fetch list from form
-        genres =  ",".join(genres) # Convert to comma separated string to store in db
+        genres = get_genres(request.form.getlist('genres')) # Fetch list from form
         # EO Generate genre list
         artist = Artist(
             name=request.form.get('name'),
@@ -485,7 +543,10 @@ def create_artist_submission():
         error = False
         try:
             db.session.add(artist)
+            db.session.flush()
+            refresh_genre_counts([genre.id for genre in artist.genres])
             db.session.commit()
+            cache.invalidate('artists')
         except:
             error = True
             db.session.rollback()
@@ -501,25 +562,72 @@ def create_artist_submission():
         # On form validation error redirect to back to prefilled form
         return render_template('forms/new_artist.html', form=form)
 
+#  Genres
+#  ----------------------------------------------------------------
+
+@app.route('/genres/<name>/artists')
+def genre_artists(name):
+    genre = queries.genre_by_name(name).first_or_404()
+    query = queries.genre_artist_listing(genre.id)
+    data, pager = keyset_paginate(query, [artist_genre.c.artistid], app.config['LISTING_PER_PAGE'])
+    return render_template('pages/genre.html', genre=genre, entity='artists', items=data,
+                           count=genre.artist_count, genres=queries.genre_facets().all(), pager=pager)
+
+@app.route('/genres/<name>/venues')
+def genre_venues(name):
+    genre = queries.genre_by_name(name).first_or_404()
+    query = queries.genre_venue_listing(genre.id)
+    data, pager = keyset_paginate(query, [venue_genre.c.venueid], app.config['LISTING_PER_PAGE'])
+    return render_template('pages/genre.html', genre=genre, entity='venues', items=data,
+                           count=genre.venue_count, genres=queries.genre_facets().all(), pager=pager)
+
 #  Shows
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@cached_page
+@conditional(queries.show_listing_stamps, dated=True)
 def shows():
-    data = []
+    # Optional date range / city browse: /shows?from=2026-10-23&to=2026-10-25&city=San Francisco, CA
+    start = parse_date(request.args.get('from'))
+    end = parse_date(request.args.get('to'))
+    city = request.args.get('city', '').strip()
+
+    def load():
+        today = date.today()
+        city_name, _, state_code = city.partition(',')
+        query = queries.show_listing(
+            today,
+            start=start,
+            end=end + timedelta(days=1) if end else None, # Inclusive of the to date
+            city_name=city_name.strip(),
+            state_code=state_code.strip()
+        )
+        # Page through shows in start time order
+        rows, pager = keyset_paginate(query, [Show.start_time, Show.id], app.config['LISTING_PER_PAGE'])
+        return [ShowSummary.from_row(row) for row in rows], pager
+
+    data, pager = cache.get_or_set(
+        'shows', (start, end, city, request.args.get('after'), request.args.get('before')),
+        show_listing_tags(start, end, city), load, dated=True
+    )
+    return render_template('pages/shows.html', shows=data, pager=pager,
+                           start=start, end=end, city=city)
+
+def show_listing_tags(start, end, city):
+    # A city's shows are purged by city, all others by side of today
+    if city:
+        city_name, _, state_code = city.partition(',')
+        cityids = queries.city_ids(city_name.strip(), state_code.strip()).all()
+        if cityids:
+            return [f'city:{cityid}' for cityid, in cityids]
     today = date.today()
-    shows = Show.query.filter(Show.start_time>today).all()
-    for show in shows:
-        show = {
-            "venue_id": show.venue.id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artistid,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": show.start_time
-        }
-        data.append(show)
-    return render_template('pages/shows.html', shows=data)
+    tags = []
+    if start is None or end is None or end >= today:
+        tags.append('shows:upcoming')
+    if start is not None and start <= today:
+        tags.append('shows:past')
+    return tags
 
 @app.route('/shows/create')
 def create_shows():
@@ -529,27 +637,56 @@ def create_shows():
 
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
-    show = Show(
-        artistid=request.form.get('artist_id'),
-        venueid=request.form.get('venue_id'),
-        start_time=request.form.get('start_time')
-    )
+    values, errors = show_values(request.form)
+    if errors:
+        # Back to the prefilled form with what's wrong with it
+        for field, messages in errors.items():
+            flash(f'{field}: {", ".join(messages)}')
+        return render_template('forms/new_show.html', form=ShowForm(request.form))
     error = False
+    reason = 'An error occurred'
     try:
+        show = Show(**values)
         db.session.add(show)
+        db.session.flush()
+        record_show(show.venueid, show.artistid, show.start_time) # Keep show counters in step
+        tags = show_cache_tags([show.venueid], [show.artistid], [show_side(show.start_time)])
         db.session.commit()
-    except:
+        cache.invalidate(*tags)
+    except IntegrityError as e:
+        # Double booked venue or artist, see Booking Checks in models.py
+        error = True
+        errors = booking_errors(e)
+        if errors:
+            reason = next(iter(errors.values()))[0]
+        db.session.rollback()
+    except SQLAlchemyError:
         error = True
         db.session.rollback()
     finally:
         db.session.close()
     if error:
-        flash('An error occurred. Show could not be listed.')
+        flash(f'{reason}. Show could not be listed.')
         return render_template('pages/home.html')
     else:
         flash('Show was successfully listed!')
         return render_template('pages/home.html')
 
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<entity>.<fmt>')
+def export(entity, fmt):
+    if entity not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+    # Streamed chunk by chunk from a server side cursor, see exporter.py
+    chunks = export_chunks(entity, fmt, app.config['EXPORT_CHUNK_SIZE'])
+    return Response(
+        stream_with_context(chunks),
+        mimetype=FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={entity}.{fmt}'}
+    )
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -575,6 +712,7 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
+    database.report_pool(app)
     app.run()
 
 # Or specify port manually:
@@ -0,0 +1,194 @@
+#----------------------------------------------------------------------------#
+# Synthetic catalog generator.
+#
+# Fills City/Venue/Artist/Show (and genre links) with reproducible random
+# data at a given scale, into SQLite or Postgres.
+#
+#   python benchmarks/catalog.py --scale small --database-url sqlite:////tmp/fyyur.db
+#   python benchmarks/catalog.py --shows 250000 --database-url postgresql://localhost/fyyur_bench
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, text
+
+# Number of shows per scale; venues, artists and cities are derived from it
+SCALES = {
+    'small': 1000,
+    'medium': 100000,
+    'large': 1000000,
+}
+
+WORDS = [
+    'Amber', 'Blue', 'Copper', 'Crystal', 'Echo', 'Electric', 'Golden', 'Hollow',
+    'Iron', 'Jade', 'Lunar', 'Midnight', 'Neon', 'Paper', 'Purple', 'Red',
+    'Rusty', 'Silver', 'Velvet', 'Wild', 'Broken', 'Lost', 'Quiet', 'Rolling',
+]
+VENUE_NOUNS = ['Hall', 'Room', 'Lounge', 'Club', 'Theatre', 'Bar', 'Hop', 'Garden', 'Stage', 'Cellar']
+ARTIST_NOUNS = ['Petals', 'Wolves', 'Echoes', 'Riders', 'Saints', 'Kings', 'Foxes', 'Machines', 'Rivers', 'Ghosts']
+
+#----------------------------------------------------------------------------#
+# Generator.
+#----------------------------------------------------------------------------#
+
+def sizes(shows):
+    venues = max(shows // 50, 1)
+    artists = max(shows // 20, 1)
+    cities = max(venues // 10, 1)
+    return cities, venues, artists
+
+def next_id(model):
+    from models import db
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+def insert_chunks(table, rows, chunk):
+    # Executemany in fixed size chunks so memory stays flat at any scale
+    from models import db
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+
+def generate(shows, seed=0, chunk=10000, log=print):
+    # Append a catalog with the given number of shows to the bound database
+    from forms import genre_choices, state_choices
+    from models import db, City, Venue, Artist, Show, Genre, venue_genre, artist_genre
+
+    rnd = random.Random(seed)
+    n_cities, n_venues, n_artists = sizes(shows)
+    started = time.perf_counter()
+
+    # Genres come from forms.genre_choices, seeded on create or by migration
+    if not db.session.query(Genre.id).first():
+        insert_chunks(Genre.__table__, ({'name': name} for name, _ in genre_choices), chunk)
+    genreids = [genreid for genreid, in db.session.query(Genre.id)]
+
+    city_start = next_id(City)
+    insert_chunks(City.__table__, (
+        {'id': city_start + i, 'city': f'City {city_start + i}', 'state': rnd.choice(state_choices)[0]}
+        for i in range(n_cities)
+    ), chunk)
+    cityids = range(city_start, city_start + n_cities)
+
+    venue_start = next_id(Venue)
+    insert_chunks(Venue.__table__, (
+        {
+            'id': venue_start + i,
+            'name': f'The {rnd.choice(WORDS)} {rnd.choice(VENUE_NOUNS)} {venue_start + i}',
+            'address': f'{rnd.randint(1, 9999)} Main St',
+            'cityid': rnd.choice(cityids),
+            'phone': '555-555-5555',
+            'seeking_talent': rnd.random() < 0.3,
+            'image_link': f'https://example.com/venues/{venue_start + i}.jpg',
+        }
+        for i in range(n_venues)
+    ), chunk)
+    venueids = range(venue_start, venue_start + n_venues)
+
+    artist_start = next_id(Artist)
+    insert_chunks(Artist.__table__, (
+        {
+            'id': artist_start + i,
+            'name': f'{rnd.choice(WORDS)} {rnd.choice(ARTIST_NOUNS)} {artist_start + i}',
+            'cityid': rnd.choice(cityids),
+            'phone': '555-555-5555',
+            'seeking_venue': rnd.random() < 0.3,
+            'image_link': f'https://example.com/artists/{artist_start + i}.jpg',
+        }
+        for i in range(n_artists)
+    ), chunk)
+    artistids = range(artist_start, artist_start + n_artists)
+
+    # One to three genres each
+    insert_chunks(venue_genre, (
+        {'venueid': venueid, 'genreid': genreid}
+        for venueid in venueids for genreid in rnd.sample(genreids, rnd.randint(1, 3))
+    ), chunk)
+    insert_chunks(artist_genre, (
+        {'artistid': artistid, 'genreid': genreid}
+        for artistid in artistids for genreid in rnd.sample(genreids, rnd.randint(1, 3))
+    ), chunk)
+
+    # Shows spread over the year either side of today, clear of the booking
+    # checks: show i is slot i // n_venues of its venue, each slot on a day of
+    # its own, and no artist plays twice in a slot as n_artists >= n_venues
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    gap = max(730 // -(-shows // n_venues), 1)
+    venue_order = rnd.sample(venueids, n_venues)
+    artist_order = rnd.sample(artistids, n_artists)
+    def show(i):
+        slot, position = divmod(i, n_venues)
+        start_time = today + timedelta(days=slot * gap - 365, hours=rnd.randint(12, 21))
+        return {
+            'venueid': venue_order[position],
+            'artistid': artist_order[i % n_artists],
+            'start_time': start_time,
+            'end_time': start_time + timedelta(hours=3),
+        }
+    insert_chunks(Show.__table__, (show(i) for i in range(shows)), chunk)
+
+    # Explicit ids above don't advance postgres sequences
+    if db.engine.dialect.name == 'postgresql':
+        for table in ('city', 'venue', 'artist', 'show'):
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+            ))
+
+    # Show counters on every venue and artist, set based
+    from counters import recount
+    recount()
+
+    db.session.execute(Genre.__table__.update().values(
+        venue_count=db.session.query(func.count()).filter(venue_genre.c.genreid == Genre.id).scalar_subquery(),
+        artist_count=db.session.query(func.count()).filter(artist_genre.c.genreid == Genre.id).scalar_subquery()
+    ))
+    db.session.commit()
+    log(f'{n_cities} cities, {n_venues} venues, {n_artists} artists, {shows} shows '
+        f'in {time.perf_counter() - started:.1f}s')
+
+#----------------------------------------------------------------------------#
+# App setup.
+#----------------------------------------------------------------------------#
+
+def create_app(database_url, **config):
+    # The app bound to database_url, with tables created
+    from app import app
+    from models import db
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config.update(config)
+    with app.app_context():
+        db.create_all()
+    return app
+
+def parse_shows(args):
+    return args.shows if args.shows else SCALES[args.scale]
+
+def add_arguments(parser):
+    parser.add_argument('--database-url', default='sqlite:///' + os.path.abspath('bench.db'))
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--shows', type=int, help='Number of shows, overrides --scale')
+    parser.add_argument('--seed', type=int, default=0)
+
+#----------------------------------------------------------------------------#
+# Main.
+#----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic Fyyur catalog')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    app = create_app(args.database_url)
+    with app.app_context():
+        generate(parse_shows(args), seed=args.seed)
@@ -0,0 +1,138 @@
+#----------------------------------------------------------------------------#
+# Query shape benchmark.
+#
+# Compares rows fetched and statements run by the old eager loading shapes
+# (lazy="joined" shows on every venue/artist load) against the per view
+# shapes in queries.py, on a synthetic SQLite catalog.
+#
+#   python benchmarks/query_shapes.py [--shows 10000]
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+from catalog import create_app, generate
+
+#----------------------------------------------------------------------------#
+# Row counting connection.
+#----------------------------------------------------------------------------#
+
+class Counter:
+    rows = 0
+    statements = 0
+
+class CountingCursor(sqlite3.Cursor):
+    # Counts every row handed back to SQLAlchemy
+
+    def fetchone(self):
+        row = super().fetchone()
+        Counter.rows += row is not None
+        return row
+
+    def fetchmany(self, *args):
+        rows = super().fetchmany(*args)
+        Counter.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        Counter.rows += len(rows)
+        return rows
+
+class CountingConnection(sqlite3.Connection):
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+#----------------------------------------------------------------------------#
+# Setup.
+#----------------------------------------------------------------------------#
+
+def setup(path, shows):
+    app = create_app('sqlite:///' + path, SQLALCHEMY_ENGINE_OPTIONS={
+        'creator': lambda: sqlite3.connect(path, factory=CountingConnection, check_same_thread=False)
+    })
+    from models import db
+    with app.app_context():
+        generate(shows)
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: setattr(Counter, 'statements', Counter.statements + 1))
+    return app
+
+#----------------------------------------------------------------------------#
+# Shapes.
+#----------------------------------------------------------------------------#
+
+def shapes():
+    import queries
+    from models import db, City, Venue, Artist, Show
+    today = date.today()
+    venue_id = 1
+
+    def venues_before():
+        for city in City.query.all():
+            for venue in Venue.query.options(joinedload(Venue.shows)).filter_by(cityid=city.id).all():
+                Show.query.filter(Show.venueid == venue.id, Show.start_time > today).count()
+
+    def venues_after():
+        queries.venue_listing().all()
+
+    def detail_before():
+        Venue.query.options(joinedload(Venue.shows)).get(venue_id)
+        db.session.query(Show).join(Venue, Venue.id == Show.venueid).options(
+            joinedload(Show.artist).joinedload(Artist.shows)).all()
+
+    def detail_after():
+        queries.venue_detail(venue_id).first()
+        for query in queries.venue_shows(venue_id, today):
+            query.limit(20).all()
+
+    def search_before():
+        Venue.query.options(joinedload(Venue.shows)).filter(Venue.name.ilike('%1%')).all()
+
+    def search_after():
+        db.session.query(Venue.id, Venue.name).filter(Venue.name.ilike('%1%')).all()
+
+    def edit_before():
+        Venue.query.options(joinedload(Venue.shows)).get(venue_id).city
+
+    def edit_after():
+        queries.venue_profile().get(venue_id)
+
+    return [
+        ('venues', venues_before, venues_after),
+        ('show_venue', detail_before, detail_after),
+        ('search_venues', search_before, search_after),
+        ('edit_venue', edit_before, edit_after),
+    ]
+
+def measure(app, fn):
+    from models import db
+    with app.app_context():
+        Counter.rows = Counter.statements = 0
+        fn()
+        db.session.remove()
+    return Counter.rows, Counter.statements
+
+#----------------------------------------------------------------------------#
+# Main.
+#----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare rows fetched per view before and after queries.py')
+    parser.add_argument('--shows', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = setup(os.path.join(tmp, 'bench.db'), args.shows)
+        print(f'{"view":<16}{"rows before":>14}{"rows after":>12}{"stmts before":>14}{"stmts after":>13}')
+        for name, before, after in shapes():
+            rows_before, statements_before = measure(app, before)
+            rows_after, statements_after = measure(app, after)
+            print(f'{name:<16}{rows_before:>14}{rows_after:>12}{statements_before:>14}{statements_after:>13}')
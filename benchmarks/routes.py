@@ -0,0 +1,222 @@
+#----------------------------------------------------------------------------#
+# Route benchmark.
+#
+# Measures latency, throughput and query counts for every route in app.py
+# through the Flask test client, against a synthetic catalog, and saves the
+# results as JSON so runs on different commits can be compared.
+#
+#   python benchmarks/routes.py --scale small
+#   python benchmarks/routes.py --scale medium --database-url postgresql://localhost/fyyur_bench
+#   python benchmarks/routes.py --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import count
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import add_arguments, create_app, generate, parse_shows
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+#----------------------------------------------------------------------------#
+# Routes.
+#----------------------------------------------------------------------------#
+
+def routes(ids):
+    # (name, method, url, form data) for every route, ids picked from the catalog
+    venue_id, artist_id, venue_ids = ids['venue'], ids['artist'], ids['venues']
+    venue_form = {
+        'name': 'Bench Venue', 'city': 'Bench City', 'state': 'CA', 'address': '1 Bench St',
+        'phone': '555-555-5555', 'genres': ['Jazz', 'Folk'], 'facebook_link': 'https://facebook.com/bench',
+        'image_link': 'https://example.com/bench.jpg',
+    }
+    artist_form = {
+        'name': 'Bench Artist', 'city': 'Bench City', 'state': 'CA',
+        'phone': '555-555-5555', 'genres': ['Jazz'], 'facebook_link': 'https://facebook.com/bench',
+        'image_link': 'https://example.com/bench.jpg',
+    }
+    # Each run books the next day, clear of the catalog's shows and the last run's
+    days = count()
+    show_form = lambda: {
+        'artist_id': artist_id, 'venue_id': venue_id,
+        'start_time': str(datetime(2031, 1, 1, 20) + timedelta(days=next(days))),
+    }
+    return [
+        ('index', 'GET', '/', None),
+        ('venues', 'GET', '/venues', None),
+        ('show_venue', 'GET', f'/venues/{venue_id}', None),
+        ('search_venues', 'POST', '/venues/search', {'search_term': 'hall'}),
+        ('artists', 'GET', '/artists', None),
+        ('show_artist', 'GET', f'/artists/{artist_id}', None),
+        ('search_artists', 'POST', '/artists/search', {'search_term': 'wolves'}),
+        ('shows', 'GET', '/shows', None),
+        ('genre_artists', 'GET', '/genres/Jazz/artists', None),
+        ('genre_venues', 'GET', '/genres/Jazz/venues', None),
+        ('create_venue_form', 'GET', '/venues/create', None),
+        ('create_artist_form', 'GET', '/artists/create', None),
+        ('create_shows', 'GET', '/shows/create', None),
+        ('edit_venue', 'GET', f'/venues/{venue_id}/edit', None),
+        ('edit_artist', 'GET', f'/artists/{artist_id}/edit', None),
+        ('create_venue_submission', 'POST', '/venues/create', venue_form),
+        ('create_artist_submission', 'POST', '/artists/create', artist_form),
+        ('create_show_submission', 'POST', '/shows/create', show_form),
+        ('edit_venue_submission', 'POST', f'/venues/{venue_id}/edit', venue_form),
+        ('edit_artist_submission', 'POST', f'/artists/{artist_id}/edit', artist_form),
+        # Each run deletes a different show-less venue
+        ('delete_venue', 'DELETE', lambda: f'/venues/{venue_ids.pop()}', None),
+    ]
+
+def pick_ids(app, iterations):
+    # Busiest venue and artist, plus fresh venues to delete
+    from sqlalchemy import func
+    from models import db, Venue, Show
+    with app.app_context():
+        venue_id = db.session.query(Show.venueid).group_by(Show.venueid).order_by(func.count().desc()).limit(1).scalar()
+        artist_id = db.session.query(Show.artistid).group_by(Show.artistid).order_by(func.count().desc()).limit(1).scalar()
+        cityid = db.session.query(Venue.cityid).limit(1).scalar()
+        venues = [Venue(name=f'Doomed {i}', address='0 Nowhere', cityid=cityid) for i in range(iterations + 1)]
+        db.session.add_all(venues)
+        db.session.commit()
+        return {'venue': venue_id, 'artist': artist_id, 'venues': [venue.id for venue in venues]}
+
+#----------------------------------------------------------------------------#
+# Measurement.
+#----------------------------------------------------------------------------#
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def measure(client, method, url, data, iterations, warmup):
+    from instrumentation import track_queries
+    latencies = []
+    statuses = set()
+    with track_queries() as stats:
+        for i in range(warmup + iterations):
+            if i == warmup:
+                stats.count = 0
+            started = time.perf_counter()
+            response = client.open(url() if callable(url) else url, method=method,
+                                   data=data() if callable(data) else data)
+            elapsed = time.perf_counter() - started
+            statuses.add(response.status_code)
+            if i >= warmup:
+                latencies.append(elapsed)
+    total = sum(latencies)
+    return {
+        'method': method,
+        'statuses': sorted(statuses),
+        'iterations': iterations,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+        'throughput_rps': round(iterations / total, 1) if total else None,
+        'queries_per_request': round(stats.count / iterations, 2),
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], text=True, cwd=os.path.dirname(RESULTS_DIR)
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def run(args):
+    shows = parse_shows(args)
+    config = {
+        'WTF_CSRF_ENABLED': False,
+        'CACHE_TYPE': 'lru' if args.cache else 'null',
+    }
+    app = create_app(args.database_url, **config)
+    from cache import cache
+    cache.init_app(app)
+    if not args.skip_generate:
+        with app.app_context():
+            generate(shows, seed=args.seed)
+
+    ids = pick_ids(app, args.warmup + args.iterations)
+    client = app.test_client()
+    results = {}
+    for name, method, url, data in routes(ids):
+        if args.only and name not in args.only:
+            continue
+        results[name] = measure(client, method, url, data, args.iterations, args.warmup)
+        result = results[name]
+        print(f'{name:<26}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+              f'{result["throughput_rps"] or 0:>10.1f}{result["queries_per_request"]:>9.1f}  {result["statuses"]}')
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+            'shows': shows,
+            'seed': args.seed,
+            'cache': args.cache,
+            'iterations': args.iterations,
+            'python': platform.python_version(),
+        },
+        'results': results,
+    }
+
+def compare(old_path, new_path):
+    # Per route p50 and query count deltas between two saved runs
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f'{old["meta"]["commit"]} -> {new["meta"]["commit"]}')
+    print(f'{"route":<26}{"p50 old":>10}{"p50 new":>10}{"change":>9}{"q old":>7}{"q new":>7}')
+    for name, result in new['results'].items():
+        before = old['results'].get(name)
+        if before is None:
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+        print(f'{name:<26}{before["p50_ms"]:>10.2f}{result["p50_ms"]:>10.2f}{change:>+8.0f}%'
+              f'{before["queries_per_request"]:>7.1f}{result["queries_per_request"]:>7.1f}')
+
+#----------------------------------------------------------------------------#
+# Main.
+#----------------------------------------------------------------------------#
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every Fyyur route')
+    add_arguments(parser)
+    parser.set_defaults(database_url=None)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--cache', action='store_true', help='Benchmark with the query cache enabled')
+    parser.add_argument('--skip-generate', action='store_true', help='Reuse the catalog already in the database')
+    parser.add_argument('--only', nargs='*', help='Route names to run')
+    parser.add_argument('--output', help='Result file, defaults to results/<commit>-<shows>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.database_url is None:
+            # Fresh throwaway SQLite database
+            args.database_url = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        print(f'{"route":<26}{"p50 ms":>10}{"p95 ms":>10}{"req/s":>10}{"queries":>9}  statuses')
+        report = run(args)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f'{report["meta"]["commit"]}-{report["meta"]["shows"]}.json')
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Saved {output}')
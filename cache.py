@@ -0,0 +1,364 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+import json
+import pickle
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from functools import wraps
+from threading import Lock
+import click
+from flask import g, request, session, has_request_context, make_response
+from flask.cli import AppGroup
+import queries
+
+#----------------------------------------------------------------------------#
+# Backends.
+#
+# A backend stores opaque values under string keys with an optional ttl in
+# seconds, and keeps integer counters used as tag generations.
+#----------------------------------------------------------------------------#
+
+class NullBackend:
+    # Caching disabled
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def get_many(self, keys):
+        return [None] * len(keys)
+
+    def incr(self, key):
+        pass
+
+class LRUBackend:
+    # In process, bounded, thread safe
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        # Tag generations, bounded the same way. A tag whose counter was
+        # evicted reads as past every generation evicted so far, a bump that
+        # never lands on one its stale entries were stored under
+        self.counters = OrderedDict()
+        self.floor = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_many(self, keys):
+        with self.lock:
+            generations = []
+            for key in keys:
+                if key in self.counters:
+                    self.counters.move_to_end(key)
+                generations.append(self.counters.get(key, self.floor))
+            return generations
+
+    def incr(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, self.floor) + 1
+            self.counters.move_to_end(key)
+            while len(self.counters) > self.maxsize:
+                _, generation = self.counters.popitem(last=False)
+                self.floor = max(self.floor, generation + 1)
+
+class RedisBackend:
+    # Shared between processes through any client with the redis-py api
+
+    def __init__(self, client, prefix='fyyur:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=ttl or None)
+
+    def get_many(self, keys):
+        return [None if value is None else int(value) for value in self.client.mget([self.prefix + key for key in keys])]
+
+    def incr(self, key):
+        self.client.incr(self.prefix + key)
+
+class LocalRedis:
+    # Stand-in for a redis client, for local runs and tests without a server
+
+    def __init__(self):
+        self.data = {}
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            value, expires = self.data.get(key, (None, None))
+            if expires is not None and expires <= time.monotonic():
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def incr(self, key):
+        with self.lock:
+            value = int(self.data.get(key, (0, None))[0]) + 1
+            self.data[key] = (str(value).encode(), None)
+            return value
+
+#----------------------------------------------------------------------------#
+# Query Cache.
+#
+# Entries are keyed by view and arguments, and tagged with the entities
+# they show (e.g. 'venue:12', 'shows'). Every tag has a generation counter
+# that is folded into the entry key, so invalidating a tag is a single
+# increment and stale entries are simply never read again.
+#----------------------------------------------------------------------------#
+
+def until_midnight():
+    # Seconds until show classification (past/upcoming) changes
+    now = datetime.now()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(int((tomorrow - now).total_seconds()), 1)
+
+class QueryCache:
+
+    def __init__(self, backend=None):
+        self.backend = backend or NullBackend()
+        self.timeout = None
+        self.purge_log = None
+
+    def init_app(self, app):
+        cache_type = app.config.get('CACHE_TYPE', 'null')
+        if cache_type == 'lru':
+            self.backend = LRUBackend(app.config.get('CACHE_LRU_SIZE', 1024))
+        elif cache_type == 'redis':
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError('CACHE_TYPE = "redis" needs the redis package installed')
+            self.backend = RedisBackend(redis.Redis.from_url(app.config['CACHE_REDIS_URL']))
+        elif cache_type == 'local-redis':
+            self.backend = RedisBackend(LocalRedis())
+        else:
+            self.backend = NullBackend()
+        self.timeout = app.config.get('CACHE_DEFAULT_TIMEOUT')
+        self.purge_log = app.config.get('CACHE_PURGE_LOG')
+
+    def key(self, view, args, tags):
+        generations = self.backend.get_many(['tag:' + tag for tag in tags])
+        if has_request_context():
+            # The page being built shows these tags as of these generations
+            seen = g.setdefault('cache_generations', {})
+            for tag, generation in zip(tags, generations):
+                seen.setdefault(tag, generation or 0)
+        return 'view:{}:{}:{}'.format(view, repr(args), ','.join(str(generation or 0) for generation in generations))
+
+    def get_or_set(self, view, args, tags, producer, dated=False):
+        # Cached value for view(args), else producer() stored under it
+        # dated entries also expire at midnight, when shows move from upcoming to past
+        key = self.key(view, args, tags)
+        if dated and has_request_context():
+            g.cache_dated = True
+        value = self.backend.get(key)
+        if value is None:
+            value = producer()
+            if self.storable():
+                self.backend.set(key, value, self.ttl(dated))
+        return value
+
+    def invalidate(self, *tags):
+        # Called after commit; also purges the pages with these surrogate keys
+        tags = sorted(set(tags))
+        for tag in tags:
+            self.backend.incr('tag:' + tag)
+        self.backend.set('purged_at', time.time())
+        if self.purge_log and tags:
+            log_purge(self.purge_log, tags)
+
+    def storable(self):
+        # Results read from a replica (replicas.py) are only stored once the
+        # last purge is older than the replica may be behind
+        staleness = g.get('replica_staleness') if has_request_context() else None
+        if staleness is None:
+            return True
+        purged = self.backend.get('purged_at')
+        return purged is None or time.time() - purged > staleness
+
+    def ttl(self, dated=False):
+        if dated:
+            return min(self.timeout, until_midnight()) if self.timeout else until_midnight()
+        return self.timeout
+
+    def get_page(self, path):
+        # (body, headers, generations, dated) of a stored page none of whose
+        # tags were invalidated since it was rendered, else None
+        page = self.backend.get('page:' + path)
+        if page is None:
+            return None
+        generations = page[2]
+        current = self.backend.get_many(['tag:' + tag for tag in generations])
+        if [generation or 0 for generation in current] != list(generations.values()):
+            return None
+        return page
+
+    def set_page(self, path, body, headers, generations, dated=False):
+        self.backend.set('page:' + path, (body, headers, generations, dated), self.ttl(dated))
+
+cache = QueryCache()
+
+#----------------------------------------------------------------------------#
+# Page Cache.
+#
+# Whole html responses, stored under their path and tagged with surrogate
+# keys: the tags of every query cache entry the page was built from, at the
+# generations it saw. A write's invalidate() purges exactly the pages
+# showing what it changed, here and (from the purge log) in a CDN in front,
+# which the response headers allow to keep pages until purged or midnight:
+#
+#   Cache-Control: public, max-age=0, s-maxage=300
+#   Surrogate-Key: venue:12 artist:7
+#
+# Browsers still revalidate every time, see conditional.py. Responses that
+# show flashed messages or set cookies are neither stored nor shared.
+#----------------------------------------------------------------------------#
+
+def cached_page(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+        if '_flashes' in session:
+            response = make_response(view(**kwargs))
+            response.cache_control.private = True
+            return response
+
+        path = request.full_path
+        page = cache.get_page(path)
+        if page is not None:
+            body, headers, generations, dated = page
+            response = make_response(body, 200, headers)
+            response.make_conditional(request)
+        else:
+            g.cache_generations = {}
+            response = make_response(view(**kwargs))
+            generations, dated = g.cache_generations, g.get('cache_dated', False)
+            if response.status_code != 200 or 'Set-Cookie' in response.headers or not generations:
+                return response
+            if not cache.storable():
+                response.cache_control.no_cache = True
+                return response
+            headers = [(name, value) for name, value in response.headers if name != 'Content-Length']
+            cache.set_page(path, response.get_data(), headers, generations, dated)
+
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 0
+        response.cache_control.s_maxage = cache.ttl(dated)
+        response.headers['Surrogate-Key'] = ' '.join(generations)
+        return response
+    return wrapper
+
+#  Purge Log
+#  ----------------------------------------------------------------
+
+def log_purge(path, keys):
+    # One NDJSON line per invalidate(), appended whole
+    line = json.dumps({'time': datetime.now().isoformat(), 'keys': keys}) + '\n'
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line)
+
+def read_purges(path, offset=0):
+    # Purges logged after byte offset, and the offset to read on from
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset
+    # A line still being written is left for the next read
+    complete = data[:data.rfind(b'\n') + 1]
+    return [json.loads(line) for line in complete.splitlines()], offset + len(complete)
+
+#----------------------------------------------------------------------------#
+# Tags.
+#----------------------------------------------------------------------------#
+
+# Show listings by side of today; a show write only purges its own side
+SHOW_TAGS = ['shows:upcoming', 'shows:past']
+
+def show_side(start_time):
+    upcoming = start_time > datetime.combine(date.today(), datetime.min.time())
+    return 'shows:upcoming' if upcoming else 'shows:past'
+
+def show_cache_tags(venue_ids, artist_ids, sides=SHOW_TAGS):
+    # Every cached view listing shows of these venues and artists: venue
+    # listing counts, show listings of those sides and of the venues' cities
+    return ['venues'] + sorted(set(sides)) + \
+        [f'venue:{venue_id}' for venue_id in venue_ids] + \
+        [f'artist:{artist_id}' for artist_id in artist_ids] + \
+        [f'city:{cityid}' for cityid, in queries.venue_city_ids(venue_ids)]
+
+def venue_cache_tags(venue_id):
+    # Every cached view that shows this venue
+    artists = queries.venue_artist_ids(venue_id).all()
+    return ['venues', *SHOW_TAGS, f'venue:{venue_id}'] + \
+        [f'artist:{artist_id}' for artist_id, _ in artists if artist_id is not None] + \
+        sorted({f'city:{cityid}' for _, cityid in artists})
+
+def artist_cache_tags(artist_id):
+    # Every cached view that shows this artist
+    venues = queries.artist_venue_ids(artist_id).all()
+    return ['artists', *SHOW_TAGS, f'artist:{artist_id}'] + \
+        [f'venue:{venue_id}' for venue_id, _ in venues] + \
+        sorted({f'city:{cityid}' for _, cityid in venues})
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+cache_cli = AppGroup('cache', help='Purge cached pages and read the purge log.')
+
+@cache_cli.command('purge')
+@click.argument('keys', nargs=-1, required=True)
+def purge_command(keys):
+    '''Purge the pages and query results tagged with KEYS.'''
+    cache.invalidate(*keys)
+    click.echo('Purged ' + ' '.join(sorted(set(keys))))
+
+@cache_cli.command('purges')
+@click.option('--offset', default=0, show_default=True, help='Byte offset returned by the previous read.')
+def purges_command(offset):
+    '''Print logged purges as NDJSON, then the offset to continue from.'''
+    if not cache.purge_log:
+        raise click.UsageError('CACHE_PURGE_LOG is not set')
+    purges, offset = read_purges(cache.purge_log, offset)
+    for purge in purges:
+        click.echo(json.dumps(purge))
+    click.echo(offset, err=True)
@@ -0,0 +1,120 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+from collections import OrderedDict
+from threading import Lock
+from sqlalchemy import event, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import db, City
+
+#----------------------------------------------------------------------------#
+# City Id Cache.
+#
+# A city row is never renamed or deleted once created: venues and artists
+# move by pointing at another (city, state), so a cached id never goes
+# stale and entries only leave the cache by eviction. The one exception,
+# the unique city, state migration merging duplicates, runs before the app
+# serves and each process starts with an empty cache.
+#----------------------------------------------------------------------------#
+
+class CityCache:
+    # Bounded, thread safe LRU map of (city, state) -> city id
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            city_id = self.entries.get(key)
+            if city_id is not None:
+                self.entries.move_to_end(key)
+            return city_id
+
+    def set(self, key, city_id):
+        with self.lock:
+            self.entries[key] = city_id
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+city_cache = CityCache()
+
+# Ids resolved inside a transaction only reach the cache once it commits,
+# so a rolled back insert can never leave a dangling id behind
+@event.listens_for(Session, 'after_commit')
+def cache_committed_cities(session):
+    for key, city_id in session.info.pop('pending_cities', {}).items():
+        city_cache.set(key, city_id)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_pending_cities(session):
+    session.info.pop('pending_cities', None)
+
+#----------------------------------------------------------------------------#
+# Get City Id.
+#----------------------------------------------------------------------------#
+
+def city_insert():
+    # INSERT of (city, state) rows leaving existing rows untouched
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(City).on_conflict_do_nothing(index_elements=['city', 'state'])
+    if dialect == 'sqlite':
+        return sqlite.insert(City).on_conflict_do_nothing(index_elements=['city', 'state'])
+    return City.__table__.insert()
+
+def insert_cities(keys):
+    db.session.execute(city_insert(), [{'city': city_name, 'state': state_code} for city_name, state_code in keys])
+
+def insert_city(city_name, state_code):
+    # Id of the new row, None when the city already existed
+    result = db.session.execute(city_insert(), {'city': city_name, 'state': state_code})
+    if result.rowcount != 1:
+        return None
+    return result.inserted_primary_key[0]
+
+def get_city(city_name, state_code):
+    key = (city_name, state_code)
+    city_id = city_cache.get(key)
+    if city_id is not None:
+        return city_id
+
+    # Check db for existing city, state
+    lookup = db.session.query(City.id).filter_by(city=city_name, state=state_code)
+    city_id = lookup.scalar()
+    if city_id is None:
+        # Else create it; only when a concurrent insert of the same city got
+        # there first is it looked up again
+        city_id = insert_city(city_name, state_code) or lookup.scalar()
+
+    db.session.info.setdefault('pending_cities', {})[key] = city_id
+    return city_id
+
+def get_cities(keys, batch=400):
+    # Batch get_city for bulk loads: {(city, state): id} in a couple of
+    # queries per batch instead of two per row
+    found = {}
+    missing = []
+    for key in set(keys):
+        city_id = city_cache.get(key)
+        if city_id is None:
+            missing.append(key)
+        else:
+            found[key] = city_id
+
+    for start in range(0, len(missing), batch):
+        keys = missing[start:start + batch]
+        lookup = db.session.query(City.city, City.state, City.id) \
+            .filter(tuple_(City.city, City.state).in_(keys))
+        resolved = {(city_name, state_code): city_id for city_name, state_code, city_id in lookup}
+        new = [key for key in keys if key not in resolved]
+        if new:
+            insert_cities(new)
+            resolved.update(((city_name, state_code), city_id) for city_name, state_code, city_id in lookup)
+        db.session.info.setdefault('pending_cities', {}).update(resolved)
+        found.update(resolved)
+    return found
@@ -0,0 +1,81 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import os
+from datetime import date, datetime, time, timezone
+from functools import wraps
+from flask import current_app, request, session, abort, make_response
+
+#----------------------------------------------------------------------------#
+# Conditional Requests.
+#
+#   @conditional(queries.venue_stamps, dated=True)
+#
+# A page is validated by the updated_at stamps of the rows it shows, read
+# with one small query: max() over indexed columns for listings, a venue's
+# or artist's own shows for details. The ETag hashes those stamps with the
+# url, the templates and, for pages split into upcoming and past shows,
+# today's date; Last-Modified is the newest stamp (or midnight). When the
+# request's If-None-Match or If-Modified-Since still holds, the view isn't
+# called at all and the answer is a 304.
+#----------------------------------------------------------------------------#
+
+_template_digests = {}
+
+def template_digest(app):
+    # Hash of every template, so a deploy that changes them changes all ETags
+    if app.name not in _template_digests:
+        digest = hashlib.sha1()
+        folder = os.path.join(app.root_path, app.template_folder)
+        for root, dirs, files in sorted(os.walk(folder)):
+            for name in sorted(files):
+                with open(os.path.join(root, name), 'rb') as f:
+                    digest.update(name.encode())
+                    digest.update(f.read())
+        _template_digests[app.name] = digest.hexdigest()
+    return _template_digests[app.name]
+
+def http_time(stamp):
+    # Naive local datetime as an aware UTC one, whole seconds as in HTTP dates
+    return stamp.astimezone(timezone.utc).replace(microsecond=0)
+
+def not_modified(etag, last_modified):
+    # If-None-Match wins over If-Modified-Since when both are sent
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return http_time(last_modified) <= request.if_modified_since
+    return False
+
+def conditional(stamps, dated=False):
+    # Validate a GET view by the first row of stamps(**view_args); no row is a 404
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            row = stamps(**kwargs).first()
+            if row is None:
+                abort(404)
+            today = date.today() if dated else None
+            known = [stamp for stamp in row if stamp is not None]
+            if dated:
+                known.append(datetime.combine(today, time()))
+            last_modified = max(known, default=None)
+            etag = hashlib.sha1(repr((
+                request.full_path, tuple(row), today, template_digest(current_app)
+            )).encode()).hexdigest()
+
+            # Flashed messages are only shown by a full render
+            if '_flashes' not in session and not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(**kwargs))
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = http_time(last_modified)
+            # Cached by browsers, but revalidated on every use
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -1,5 +1,12 @@
+import json
 import os
-SECRET_KEY = os.urandom(32)
+# Settings below are the development defaults. FYYUR_ENV picks a profile
+# (development, test or production) layered on top, and any setting can
+# then be overridden by a FYYUR_<NAME> environment variable, see Profiles.
+PROFILE = os.environ.get('FYYUR_ENV', 'development')
+
+# Signs sessions and CSRF tokens, so every worker must share it
+SECRET_KEY = 'development'
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -10,3 +17,171 @@ DEBUG = True
 SQLALCHEMY_DATABASE_URI = 'postgresql://lucyweatherley@localhost:5432/fyyur'
 
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool of each server process, per database (sqlite keeps
+# Flask-SQLAlchemy's pools): at most DB_POOL_SIZE + DB_MAX_OVERFLOW
+# connections, waiting DB_POOL_TIMEOUT seconds for one, each replaced after
+# DB_POOL_RECYCLE seconds and tested on checkout with DB_POOL_PRE_PING.
+# SERVER_WORKERS processes of SERVER_THREADS threads each share the server's
+# connections, see `flask pool check`
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 5
+DB_POOL_TIMEOUT = 10
+DB_POOL_RECYCLE = 1800
+DB_POOL_PRE_PING = True
+SERVER_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+SERVER_THREADS = 1
+
+# Prefork server (gunicorn.conf.py): a worker is replaced after serving
+# SERVER_MAX_REQUESTS requests, give or take SERVER_MAX_REQUESTS_JITTER so
+# workers don't all restart at once, finishing its requests for up to
+# SERVER_GRACEFUL_TIMEOUT seconds; one silent for SERVER_TIMEOUT is killed
+SERVER_MAX_REQUESTS = 2000
+SERVER_MAX_REQUESTS_JITTER = 200
+SERVER_GRACEFUL_TIMEOUT = 30
+SERVER_TIMEOUT = 60
+
+# Milliseconds a statement may run during a request before postgres
+# cancels it (None for no limit), with per endpoint overrides. Commands
+# such as import and counters run without one
+STATEMENT_TIMEOUT = 5000
+STATEMENT_TIMEOUTS = {
+    'export': 60000,
+    'api.batch_venues': 30000,
+    'api.batch_artists': 30000,
+    'api.batch_shows': 30000,
+}
+
+# Read replicas of the database above, empty to read from it alone. The
+# read only endpoints below use one no more than REPLICA_MAX_LAG seconds
+# behind, measured every REPLICA_LAG_INTERVAL seconds; a browser that wrote
+# reads from the primary for REPLICA_STICKY_SECONDS. See replicas.py
+SQLALCHEMY_REPLICA_URIS = []
+REPLICA_ENDPOINTS = {
+    'venues',
+    'show_venue',
+    'search_venues',
+    'artists',
+    'show_artist',
+    'search_artists',
+    'shows',
+    'genre_venues',
+    'genre_artists',
+}
+REPLICA_MAX_LAG = 5
+REPLICA_LAG_INTERVAL = 2
+REPLICA_STICKY_SECONDS = 10
+
+# Number of shows per page on venue and artist pages
+SHOWS_PER_PAGE = 20
+
+# Number of results per page on search pages
+SEARCH_RESULTS_PER_PAGE = 20
+
+# Number of rows per page on venue, artist and show listings
+LISTING_PER_PAGE = 50
+
+# Length of a show when no end time is given
+SHOW_DURATION_MINUTES = 180
+
+# Days ahead that recurring series are expanded into shows
+SERIES_WINDOW_DAYS = 90
+
+# Most items accepted by one /api/v1/<entity>/batch request
+API_BATCH_SIZE = 1000
+
+# Rows fetched and streamed at a time by /export
+EXPORT_CHUNK_SIZE = 1000
+
+# Number of resolved city ids kept in memory per process
+CITY_CACHE_SIZE = 1024
+
+# Query result cache: 'lru' (per process), 'redis' (shared, needs the redis
+# package and CACHE_REDIS_URL), 'local-redis' (in memory redis stand-in) or 'null'
+CACHE_TYPE = 'lru'
+# Entries, and tag generations, an 'lru' cache keeps
+CACHE_LRU_SIZE = 1024
+CACHE_REDIS_URL = 'redis://localhost:6379/0'
+CACHE_DEFAULT_TIMEOUT = 300
+
+# Whole pages are cached in the same store, tagged with surrogate keys.
+# Every purge is appended to this NDJSON log (None to turn it off) for a
+# CDN in front to replay, see `flask cache purges`
+CACHE_PURGE_LOG = os.path.join(basedir, 'purges.ndjson')
+
+# Query instrumentation: statements allowed per request (None to disable)
+# and per endpoint overrides, logged when exceeded and enforced by the
+# tests, and how many runs of the same statement in one request count as an N+1
+QUERY_BUDGET = 10
+QUERY_BUDGETS = {
+    'venues': 2,
+    'artists': 2,
+    # Browsing a city looks it up first
+    'shows': 3,
+    'show_venue': 6,
+    'show_artist': 6,
+    'api.list_venues': 1,
+    'api.list_artists': 1,
+    'api.list_shows': 1,
+    'api.get_venue': 1,
+    'api.get_artist': 1,
+    # Writes: a new city and genres each cost an insert and a recount,
+    # shows a clash check and the counters of their venues and artists
+    'api.edit_venue': 14,
+    'api.edit_artist': 14,
+    'api.patch_venue': 12,
+    'api.patch_artist': 12,
+    'api.batch_venues': 10,
+    'api.batch_artists': 10,
+    'api.batch_shows': 10,
+    'api.create_series': 12,
+    'api.patch_series': 14,
+}
+QUERY_REPEAT_THRESHOLD = 3
+
+#----------------------------------------------------------------------------#
+# Profiles.
+#----------------------------------------------------------------------------#
+
+profiles = {
+    'development': {},
+    'test': {
+        'DEBUG': False,
+        'TESTING': True,
+        'SECRET_KEY': 'test',
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'WTF_CSRF_ENABLED': False,
+        'CACHE_PURGE_LOG': None,
+    },
+    # Secret and database must come from the environment; workers share
+    # one cache, so a write purges pages in all of them
+    'production': {
+        'DEBUG': False,
+        'SECRET_KEY': None,
+        'SQLALCHEMY_DATABASE_URI': None,
+        'SERVER_WORKERS': int(os.environ.get('WEB_CONCURRENCY', 2)),
+        'CACHE_TYPE': 'redis',
+    },
+}
+
+def from_environ(name, default):
+    # FYYUR_<NAME> as JSON (numbers, true, null, lists), else as a string
+    value = os.environ.get('FYYUR_' + name)
+    if value is None:
+        return default
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+if PROFILE not in profiles:
+    raise RuntimeError(f'FYYUR_ENV must be one of {", ".join(profiles)}, not {PROFILE!r}')
+globals().update(profiles[PROFILE])
+for name in [name for name in globals() if name.isupper()]:
+    globals()[name] = from_environ(name, globals()[name])
+
+# Set by hosting platforms; SQLAlchemy only takes the postgresql:// scheme
+if 'DATABASE_URL' in os.environ and 'FYYUR_SQLALCHEMY_DATABASE_URI' not in os.environ:
+    SQLALCHEMY_DATABASE_URI = os.environ['DATABASE_URL'].replace('postgres://', 'postgresql://', 1)
+if 'REDIS_URL' in os.environ and 'FYYUR_CACHE_REDIS_URL' not in os.environ:
+    CACHE_REDIS_URL = os.environ['REDIS_URL']
@@ -0,0 +1,118 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+from datetime import date, datetime, timedelta
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, select, or_
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Show Counters.
+#
+# Venue and Artist carry upcoming_shows_count / past_shows_count so listings
+# never touch the show table. A show is upcoming while start_time > today,
+# the same split the detail pages use. Writes adjust counters in their own
+# transaction, and a daily roll forward recounts entities whose shows have
+# crossed midnight since.
+#----------------------------------------------------------------------------#
+
+def record_show(venueid, artistid, start_time, delta=1):
+    # Adjust counters for one created (delta=1) or deleted (delta=-1) show
+    upcoming = start_time > datetime.combine(date.today(), datetime.min.time())
+    column = 'upcoming_shows_count' if upcoming else 'past_shows_count'
+    for model, entity_id in ((Venue, venueid), (Artist, artistid)):
+        counter = getattr(model, column)
+        db.session.query(model).filter(model.id == entity_id) \
+            .update({counter: counter + delta}, synchronize_session=False)
+
+def counts_for(model, fk, today):
+    # Correlated (upcoming, past) counts for each row of model
+    upcoming = select(func.count(Show.id)).where(fk == model.id, Show.start_time > today).scalar_subquery()
+    past = select(func.count(Show.id)).where(fk == model.id, Show.start_time <= today).scalar_subquery()
+    return upcoming, past
+
+def recount(venue_ids=None, artist_ids=None):
+    # Set based rebuild of counters, for the given ids or everything (None)
+    today = date.today()
+    for model, fk, ids in ((Venue, Show.venueid, venue_ids), (Artist, Show.artistid, artist_ids)):
+        upcoming, past = counts_for(model, fk, today)
+        query = db.session.query(model)
+        if ids is not None:
+            if not ids:
+                continue
+            query = query.filter(model.id.in_(ids))
+        query.update({
+            model.upcoming_shows_count: upcoming,
+            model.past_shows_count: past
+        }, synchronize_session=False)
+
+def roll_forward(days=1):
+    # Recount venues and artists with shows that turned past in the last days,
+    # run daily after midnight; days > 1 catches up on missed runs
+    today = date.today()
+    crossed = db.session.query(Show.venueid, Show.artistid) \
+        .filter(Show.start_time > today - timedelta(days=days), Show.start_time <= today)
+    venue_ids = {venueid for venueid, _ in crossed}
+    artist_ids = {artistid for _, artistid in crossed}
+    recount(venue_ids, artist_ids)
+    return venue_ids, artist_ids
+
+def mismatches(model, fk):
+    # Rows whose stored counters disagree with the show table
+    upcoming, past = counts_for(model, fk, date.today())
+    upcoming = upcoming.label('upcoming')
+    past = past.label('past')
+    rows = db.session.query(model.id, model.upcoming_shows_count, upcoming, model.past_shows_count, past).subquery()
+    return db.session.query(rows).filter(or_(
+        rows.c.upcoming_shows_count != rows.c.upcoming,
+        rows.c.past_shows_count != rows.c.past
+    )).all()
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+def invalidate_all():
+    # Listings; cached detail pages expire on their own timeout
+    from cache import cache, SHOW_TAGS
+    cache.invalidate('venues', 'artists', *SHOW_TAGS)
+
+counters_cli = AppGroup('counters', help='Maintain denormalized show counters.')
+
+@counters_cli.command('roll')
+@click.option('--days', default=1, show_default=True, help='Days of shows to roll from upcoming to past.')
+def roll_command(days):
+    '''Move shows that started since the last run from upcoming to past.'''
+    from cache import cache, show_cache_tags
+    venue_ids, artist_ids = roll_forward(days)
+    tags = show_cache_tags(venue_ids, artist_ids)
+    db.session.commit()
+    cache.invalidate(*tags)
+    click.echo(f'Rolled counters for {len(venue_ids)} venues, {len(artist_ids)} artists')
+
+@counters_cli.command('check')
+@click.option('--fix', is_flag=True, help='Rebuild counters of mismatched rows.')
+def check_command(fix):
+    '''Compare stored counters with the show table.'''
+    venues = mismatches(Venue, Show.venueid)
+    artists = mismatches(Artist, Show.artistid)
+    for name, rows in (('venue', venues), ('artist', artists)):
+        for row in rows:
+            click.echo(f'{name} {row.id}: upcoming {row.upcoming_shows_count} != {row.upcoming}, '
+                       f'past {row.past_shows_count} != {row.past}')
+    click.echo(f'{len(venues)} venues, {len(artists)} artists out of date')
+    if fix and (venues or artists):
+        recount([row.id for row in venues], [row.id for row in artists])
+        db.session.commit()
+        invalidate_all()
+        click.echo('Fixed')
+
+@counters_cli.command('rebuild')
+def rebuild_command():
+    '''Recount every venue and artist.'''
+    recount()
+    db.session.commit()
+    invalidate_all()
+    click.echo('Rebuilt all counters')
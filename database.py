@@ -0,0 +1,171 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+import os
+import click
+from flask import current_app, has_request_context, request
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError, DisconnectionError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+from models import db, pool_options
+from instrumentation import untracked
+from replicas import replica_binds
+
+#----------------------------------------------------------------------------#
+# Statement Timeouts.
+#
+# On postgres every transaction a request begins, on the primary or a
+# replica, starts with SET LOCAL statement_timeout: STATEMENT_TIMEOUT ms, or
+# the endpoint's entry in STATEMENT_TIMEOUTS. A statement running longer is
+# cancelled and the request fails instead of holding a connection. The SET
+# isn't counted in query stats.
+#----------------------------------------------------------------------------#
+
+def statement_timeout(app, endpoint):
+    return app.config['STATEMENT_TIMEOUTS'].get(endpoint, app.config['STATEMENT_TIMEOUT'])
+
+@event.listens_for(Session, 'after_begin')
+def set_statement_timeout(session, transaction, connection):
+    if not has_request_context() or connection.dialect.name != 'postgresql':
+        return
+    timeout = statement_timeout(current_app, request.endpoint)
+    if timeout is not None:
+        with untracked():
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+#----------------------------------------------------------------------------#
+# Pool Check.
+#
+# Settings that would break every request stop the app from starting; the
+# pool each process opens to each database is logged when serving and
+# checked against the servers by `flask pool check`.
+#----------------------------------------------------------------------------#
+
+# Cache backends each worker keeps to itself, see cache.py
+PROCESS_CACHES = ('lru', 'local-redis')
+
+def config_errors(app):
+    errors = []
+    if not app.config.get('SECRET_KEY'):
+        errors.append('SECRET_KEY is not set, export FYYUR_SECRET_KEY')
+    if not app.config.get('SQLALCHEMY_DATABASE_URI'):
+        errors.append('SQLALCHEMY_DATABASE_URI is not set, export DATABASE_URL')
+    # A purge only reaches the worker that made it, others serve stale pages
+    if app.config['SERVER_WORKERS'] > 1 and app.config['CACHE_TYPE'] in PROCESS_CACHES:
+        errors.append(f'CACHE_TYPE {app.config["CACHE_TYPE"]!r} is per process, '
+                      f'{app.config["SERVER_WORKERS"]} workers need "redis" or "null"')
+    return errors
+
+def engines(app):
+    # (name, engine) of the primary and every replica
+    return [('primary', db.get_engine(app))] + [(key, db.get_engine(app, key)) for key in replica_binds(app)]
+
+def most_connections(app, engine):
+    # Connections one process can hold open, None when unbounded
+    options = pool_options(app, engine.url)
+    if not options or options['pool_size'] == 0 or options['max_overflow'] < 0:
+        return None
+    return options['pool_size'] + options['max_overflow']
+
+def describe_pool(app, engine):
+    # The pool as configured, see POOL_OPTIONS in models.py
+    line = f'{engine.url!r}: {type(engine.pool).__name__}'
+    options = pool_options(app, engine.url)
+    if options:
+        line += ' size={pool_size} overflow={max_overflow} timeout={pool_timeout}s ' \
+                'recycle={pool_recycle}s pre_ping={pool_pre_ping}'.format(**options)
+    most = most_connections(app, engine)
+    if most is not None:
+        workers = app.config['SERVER_WORKERS']
+        line += f', up to {workers} workers x {most} = {workers * most} connections'
+    return line
+
+def pool_warnings(app, engine):
+    most = most_connections(app, engine)
+    if most is not None and most < app.config['SERVER_THREADS']:
+        return [f'{most} connections for {app.config["SERVER_THREADS"]} threads per worker, requests will queue for them']
+    return []
+
+def report_pool(app):
+    # Log the effective pool of every database, as serving starts
+    app.logger.info('Profile %s, %d workers x %d threads', app.config['PROFILE'],
+                    app.config['SERVER_WORKERS'], app.config['SERVER_THREADS'])
+    for name, engine in engines(app):
+        app.logger.info('%s %s', name, describe_pool(app, engine))
+        for warning in pool_warnings(app, engine):
+            app.logger.warning('%s %s', name, warning)
+
+def init_app(app):
+    errors = config_errors(app)
+    if errors:
+        raise RuntimeError(f'{app.config["PROFILE"]} config: ' + '; '.join(errors))
+
+#----------------------------------------------------------------------------#
+# Forking.
+#
+# A prefork server (wsgi.py) imports the app once and forks workers from
+# it. The master disposes of its pools before forking and every worker
+# replaces the pools it inherits without closing their connections, so each
+# opens its own. Closing a connection opened before the fork would end the
+# parent's session as well, so one that slips through anyway is dropped
+# unclosed on checkout and replaced.
+#----------------------------------------------------------------------------#
+
+def dispose_engines(app, close=True):
+    # close=False in a forked child leaves the parent's connections alone
+    for name, engine in engines(app):
+        engine.dispose(close=close)
+
+@event.listens_for(Pool, 'connect')
+def record_pid(dbapi_connection, connection_record):
+    connection_record.info['pid'] = os.getpid()
+
+@event.listens_for(Pool, 'checkout')
+def check_pid(dbapi_connection, connection_record, connection_proxy):
+    pid = connection_record.info['pid']
+    if pid != os.getpid():
+        connection_record.dbapi_connection = connection_proxy.dbapi_connection = None
+        raise DisconnectionError(f'Connection opened by process {pid}, checked out in {os.getpid()}')
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+pool_cli = AppGroup('pool', help='Check connection pools.')
+
+@pool_cli.command('check')
+def check_command():
+    '''Connect to every database and size its pool against the server.'''
+    app = current_app
+    failed = False
+    click.echo(f'Profile {app.config["PROFILE"]}, {app.config["SERVER_WORKERS"]} workers x {app.config["SERVER_THREADS"]} threads')
+    for name, engine in engines(app):
+        click.echo(f'{name} {describe_pool(app, engine)}')
+        for warning in pool_warnings(app, engine):
+            click.echo(f'  warning: {warning}')
+        try:
+            with engine.connect() as conn:
+                if engine.dialect.name != 'postgresql':
+                    click.echo('  connected')
+                    continue
+                limit = int(conn.exec_driver_sql('SHOW max_connections').scalar()) - \
+                    int(conn.exec_driver_sql('SHOW superuser_reserved_connections').scalar())
+                timeout = statement_timeout(app, None)
+                click.echo(f'  connected, server allows {limit} connections, ' +
+                           (f'statements time out after {timeout} ms' if timeout else 'no statement timeout'))
+        except SQLAlchemyError as e:
+            click.echo(f'  unreachable: {e}', err=True)
+            failed = True
+            continue
+        most = most_connections(app, engine)
+        if most is None:
+            click.echo('  warning: pool is unbounded', err=True)
+        elif app.config['SERVER_WORKERS'] * most > limit:
+            click.echo(f'  warning: workers can open {app.config["SERVER_WORKERS"] * most} connections, '
+                       f'more than the {limit} allowed', err=True)
+            failed = True
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,80 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import click
+from flask.cli import with_appcontext
+import queries
+from importer import chunks
+
+#----------------------------------------------------------------------------#
+# Streaming Export.
+#
+#   GET /export/shows.ndjson
+#   flask export shows --format ndjson -o shows.ndjson
+#
+# Rows come off a server side cursor (stream_results on postgres) a chunk
+# at a time and each chunk is written out as one piece of text, so neither
+# the result set nor the response is ever held whole. Column names match
+# the import command, so an export can be loaded back with `flask import`.
+#----------------------------------------------------------------------------#
+
+EXPORTS = {
+    'venues': queries.venue_export,
+    'artists': queries.artist_export,
+    'shows': queries.show_export,
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+def json_default(value):
+    # Dates and datetimes as ISO 8601
+    return value.isoformat()
+
+def export_chunks(entity, fmt, chunk=1000):
+    # Yield the export as text, one chunk of rows at a time
+    query = EXPORTS[entity]()
+    columns = [column['name'] for column in query.column_descriptions]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(columns)
+
+    for batch in chunks(query.yield_per(chunk), chunk):
+        if fmt == 'csv':
+            writer.writerows(batch)
+        else:
+            for row in batch:
+                row = dict(zip(columns, row))
+                if 'genres' in row:
+                    row['genres'] = row['genres'].split(',') if row['genres'] else []
+                buffer.write(json.dumps(row, default=json_default))
+                buffer.write('\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header only export of an empty table
+    if buffer.tell():
+        yield buffer.getvalue()
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@click.command('export')
+@click.argument('entity', type=click.Choice(list(EXPORTS)))
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='csv', show_default=True)
+@click.option('-o', '--output', type=click.File('w', encoding='utf-8'), default='-', help='Output file, stdout by default.')
+@click.option('--chunk', default=1000, show_default=True, help='Rows fetched and written at a time.')
+@with_appcontext
+def export_cli(entity, fmt, output, chunk):
+    '''Stream ENTITY (venues, artists or shows) to CSV or NDJSON.'''
+    for text in export_chunks(entity, fmt, chunk):
+        output.write(text)
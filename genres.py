@@ -0,0 +1,25 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+from sqlalchemy import func, select
+from models import Genre, venue_genre, artist_genre
+
+#----------------------------------------------------------------------------#
+# Genres.
+#----------------------------------------------------------------------------#
+
+def get_genres(names):
+    # Genre rows for submitted names in one query
+    if not names:
+        return []
+    return Genre.query.filter(Genre.name.in_(names)).all()
+
+def refresh_genre_counts(genreids):
+    # Recount facet counters for the given genres, in the current transaction
+    if not genreids:
+        return
+    Genre.query.filter(Genre.id.in_(set(genreids))).update({
+        Genre.venue_count: select(func.count()).where(venue_genre.c.genreid == Genre.id).scalar_subquery(),
+        Genre.artist_count: select(func.count()).where(artist_genre.c.genreid == Genre.id).scalar_subquery()
+    }, synchronize_session=False)
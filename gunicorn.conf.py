@@ -0,0 +1,40 @@
+#----------------------------------------------------------------------------#
+# gunicorn settings, read by `gunicorn wsgi:app` from this directory.
+#
+# Sized and recycled by the SERVER_* settings in config.py, so FYYUR_ENV
+# and FYYUR_<NAME> overrides apply here too.
+#----------------------------------------------------------------------------#
+
+import os
+# Not `config`, which gunicorn takes for its own setting
+import config as settings
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '5000')
+workers = settings.SERVER_WORKERS
+threads = settings.SERVER_THREADS
+
+# Import the app once in the master and fork workers from it, see wsgi.py
+preload_app = True
+
+# Replace workers gracefully after a number of requests
+max_requests = settings.SERVER_MAX_REQUESTS
+max_requests_jitter = settings.SERVER_MAX_REQUESTS_JITTER
+graceful_timeout = settings.SERVER_GRACEFUL_TIMEOUT
+timeout = settings.SERVER_TIMEOUT
+
+def when_ready(server):
+    from wsgi import app
+    import database
+    database.report_pool(app)
+
+def post_fork(server, worker):
+    # Fresh pools for this worker, leaving any inherited connection open
+    from wsgi import app
+    import database
+    database.dispose_engines(app, close=False)
+
+def worker_exit(server, worker):
+    # Close this worker's connections rather than leaving them to time out
+    from wsgi import app
+    import database
+    database.dispose_engines(app)
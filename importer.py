@@ -0,0 +1,414 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+from itertools import islice
+import click
+import dateutil.parser
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm
+from models import db, Venue, Artist, Show, Genre, venue_genre, artist_genre, overlap_column
+from cities import get_cities
+from cache import cache, show_side, show_cache_tags
+from counters import recount
+from genres import refresh_genre_counts
+import queries
+
+#----------------------------------------------------------------------------#
+# Bulk Import.
+#
+#   flask import venues venues.csv
+#   flask import shows shows.ndjson --chunk 5000
+#
+# Input is read one row at a time and written one chunk per transaction, so
+# memory stays flat at any file size. Venue and artist rows go through the
+# same VenueForm / ArtistForm rules as the create pages. Rows that fail are
+# reported on stderr with their line number and skipped.
+#----------------------------------------------------------------------------#
+
+# Errors of a row that isn't an object at all (bad NDJSON line, API item)
+NOT_AN_OBJECT = {'row': ['Not a JSON object']}
+
+# Checkbox values the create forms would have left unticked
+FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n')
+
+def read_rows(file, fmt):
+    # Yield (line number, row dict) from CSV with a header or NDJSON;
+    # an NDJSON line that doesn't parse comes through as None
+    if fmt == 'ndjson':
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+    else:
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def form_data(row):
+    # Row as submitted form data; genres may be a list or comma separated
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key == 'genres' and isinstance(value, str):
+            value = [genre.strip() for genre in value.split(',') if genre.strip()]
+        if key.startswith('seeking_'):
+            # Checkbox, only sent when ticked
+            if value if isinstance(value, bool) else str(value).strip().lower() not in FALSE_VALUES:
+                data[key] = 'y'
+        elif isinstance(value, list):
+            data.setlist(key, [str(item) for item in value])
+        else:
+            data[key] = str(value)
+    return data
+
+def format_errors(errors):
+    # {field: [messages]} as one line
+    return '; '.join(f'{field}: {", ".join(messages)}' for field, messages in errors.items())
+
+#----------------------------------------------------------------------------#
+# Writes.
+#----------------------------------------------------------------------------#
+
+def copy_rows(table, columns, rows):
+    # Postgres COPY through an in-memory CSV buffer of one chunk
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row[column] is None else row[column] for column in columns])
+    buffer.seek(0)
+    connection = db.session.connection()
+    statement = f'''COPY "{table.name}" ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')'''
+    dbapi_error = connection.dialect.dbapi.Error
+    try:
+        connection.connection.cursor().copy_expert(statement, buffer)
+    except dbapi_error as error:
+        # Raised as SQLAlchemy raises any other statement's errors, so a
+        # double booking is an IntegrityError for booking_errors
+        raise DBAPIError.instance(statement, None, error, dbapi_error) from error
+
+def insert_rows(table, rows):
+    # One bulk statement per chunk: COPY on postgres, executemany elsewhere
+    if not rows:
+        return
+    if db.engine.dialect.name == 'postgresql':
+        copy_rows(table, list(rows[0]), rows)
+    else:
+        db.session.execute(table.insert(), rows)
+
+def insert_entities(table, rows):
+    # Rows need their ids before genre links can be written. Postgres hands
+    # out a chunk of ids from the sequence; on sqlite the first insert takes
+    # the database write lock until commit, so the ids following its own
+    # are free to assign; elsewhere each insert reports its own
+    dialect = db.engine.dialect.name
+    if not rows:
+        return
+    if dialect == 'postgresql':
+        ids = db.session.execute(text(
+            "SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :n)"
+        ), {'table': table.name, 'n': len(rows)}).scalars()
+        for row, row_id in zip(rows, ids):
+            row['id'] = row_id
+        insert_rows(table, rows)
+    elif dialect == 'sqlite':
+        first = db.session.execute(table.insert(), rows[0]).inserted_primary_key[0]
+        for offset, row in enumerate(rows):
+            row['id'] = first + offset
+        insert_rows(table, rows[1:])
+    else:
+        for row in rows:
+            row['id'] = db.session.execute(table.insert(), row).inserted_primary_key[0]
+
+#----------------------------------------------------------------------------#
+# Venues and Artists.
+#----------------------------------------------------------------------------#
+
+def venue_values(form):
+    return {
+        'name': form.name.data,
+        'address': form.address.data,
+        'phone': form.phone.data,
+        'website': form.website_link.data,
+        'facebook_link': form.facebook_link.data,
+        'seeking_talent': form.seeking_talent.data,
+        'seeking_description': form.seeking_description.data,
+        'image_link': form.image_link.data
+    }
+
+def artist_values(form):
+    return {
+        'name': form.name.data,
+        'phone': form.phone.data,
+        'website': form.website_link.data,
+        'facebook_link': form.facebook_link.data,
+        'seeking_venue': form.seeking_venue.data,
+        'seeking_description': form.seeking_description.data,
+        'image_link': form.image_link.data
+    }
+
+# kind -> form, table, values, genre link table, link column
+ENTITIES = {
+    'venues': (VenueForm, Venue.__table__, venue_values, venue_genre, 'venueid'),
+    'artists': (ArtistForm, Artist.__table__, artist_values, artist_genre, 'artistid'),
+}
+
+def validate_entities(kind, batch, reject):
+    # (number, city, genres, values) for the valid (number, row) pairs of
+    # batch, the others go to reject(number, errors)
+    form_class, _, values, _, _ = ENTITIES[kind]
+    # One form, re-processed per row; binding fields costs more than validating
+    form = form_class(formdata=None, meta={'csrf': False})
+    valid = []
+    for number, row in batch:
+        if row is None:
+            reject(number, NOT_AN_OBJECT)
+            continue
+        form.process(form_data(row))
+        if not form.validate():
+            reject(number, {field: errors for field, errors in form.errors.items() if errors})
+            continue
+        valid.append((number, (form.city.data, form.state.data), set(form.genres.data), values(form)))
+    return valid
+
+def write_entities(kind, valid):
+    # Resolve cities and insert validated rows with their genre links, in
+    # the current transaction; returns the inserted rows, ids set
+    _, table, _, link_table, link_column = ENTITIES[kind]
+    genre_ids = dict(db.session.query(Genre.name, Genre.id))
+    cities = get_cities(city for _, city, _, _ in valid)
+    for _, city, _, entity in valid:
+        entity['cityid'] = cities[city]
+    insert_entities(table, [entity for _, _, _, entity in valid])
+    insert_rows(link_table, [
+        {link_column: entity['id'], 'genreid': genre_ids[name]}
+        for _, _, genres, entity in valid for name in genres
+    ])
+    return [entity for _, _, _, entity in valid]
+
+def import_entities(kind, rows, chunk, reject):
+    # Validate and insert venues or artists a chunk at a time; returns imported count
+    imported = 0
+    for batch in chunks(rows, chunk):
+        valid = validate_entities(kind, batch, reject)
+        if valid:
+            write_entities(kind, valid)
+            db.session.commit()
+            imported += len(valid)
+    return imported
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+def show_values(row):
+    # (show columns, None) from a row, or (None, field errors)
+    if row is None:
+        return None, NOT_AN_OBJECT
+    try:
+        start_time = dateutil.parser.parse(row['start_time'])
+        if row.get('end_time'):
+            end_time = dateutil.parser.parse(row['end_time'])
+        else:
+            end_time = start_time + timedelta(minutes=current_app.config['SHOW_DURATION_MINUTES'])
+        show = {
+            'venueid': int(row['venue_id']),
+            'artistid': int(row['artist_id']),
+            'start_time': start_time,
+            'end_time': end_time
+        }
+    except KeyError as e:
+        return None, {e.args[0]: ['This field is required.']}
+    except (TypeError, ValueError, OverflowError):
+        return None, {'row': ['venue_id, artist_id, start_time and end_time must be ids and dates']}
+    # Shows are stored in naive local time
+    for key in ('start_time', 'end_time'):
+        if show[key].tzinfo is not None:
+            show[key] = show[key].astimezone().replace(tzinfo=None)
+    if show['end_time'] <= show['start_time']:
+        return None, {'end_time': ['Must be after start_time']}
+    return show, None
+
+def validate_shows(batch, reject):
+    # (number, show) for the valid (number, row) pairs of batch, with venues
+    # and artists checked for the whole batch at once
+    valid = []
+    for number, row in batch:
+        show, errors = show_values(row)
+        if errors:
+            reject(number, errors)
+        else:
+            valid.append((number, show))
+
+    venue_ids = {show['venueid'] for _, show in valid}
+    artist_ids = {show['artistid'] for _, show in valid}
+    venue_ids = {venue_id for venue_id, in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+    artist_ids = {artist_id for artist_id, in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+    shows = []
+    for number, show in valid:
+        if show['venueid'] not in venue_ids:
+            reject(number, {'venue_id': [f'No venue {show["venueid"]}']})
+        elif show['artistid'] not in artist_ids:
+            reject(number, {'artist_id': [f'No artist {show["artistid"]}']})
+        else:
+            shows.append((number, show))
+    return shows
+
+BOOKED = {
+    'venueid': {'venue_id': ['Venue is already booked at that time']},
+    'artistid': {'artist_id': ['Artist is already booked at that time']}
+}
+
+def booking_errors(error):
+    # Field errors for a double booking, None for any other integrity error
+    return BOOKED.get(overlap_column(error))
+
+def clashes(booked, start, end):
+    # Whether [start, end) overlaps one of booked, sorted (start, end) pairs
+    # that don't overlap each other: only the last one starting before end can
+    i = bisect_left(booked, (end,))
+    return i > 0 and booked[i - 1][1] > start
+
+def unbooked_shows(shows, reject):
+    # (number, show) pairs that double book no one, against the shows stored
+    # and the earlier pairs, read with one query; the others go to reject
+    if not shows:
+        return shows
+    rows = queries.booked_shows(
+        {show['venueid'] for _, show in shows},
+        {show['artistid'] for _, show in shows},
+        min(show['start_time'] for _, show in shows),
+        max(show['end_time'] for _, show in shows)
+    )
+    booked = {}
+    for venueid, artistid, start_time, end_time in rows:
+        insort(booked.setdefault(('venueid', venueid), []), (start_time, end_time))
+        insort(booked.setdefault(('artistid', artistid), []), (start_time, end_time))
+
+    unbooked = []
+    for number, show in shows:
+        keys = [(column, show[column]) for column in BOOKED]
+        clash = next((column for column, key in keys
+                      if clashes(booked.get((column, key), []), show['start_time'], show['end_time'])), None)
+        if clash:
+            reject(number, BOOKED[clash])
+            continue
+        for key in keys:
+            insort(booked.setdefault(key, []), (show['start_time'], show['end_time']))
+        unbooked.append((number, show))
+    return unbooked
+
+def insert_shows(shows, reject, ids=False):
+    # Insert (number, show) pairs with one bulk statement, after sending the
+    # ones that double book anyone to reject. If a show booked meanwhile
+    # still makes it fail, redo them one by one under savepoints; returns the
+    # inserted shows
+    shows = unbooked_shows(shows, reject)
+    if not shows:
+        return []
+    try:
+        with db.session.begin_nested():
+            if ids:
+                insert_entities(Show.__table__, [show for _, show in shows])
+            else:
+                insert_rows(Show.__table__, [show for _, show in shows])
+        return [show for _, show in shows]
+    except IntegrityError as error:
+        if booking_errors(error) is None:
+            raise
+
+    inserted = []
+    for number, show in shows:
+        show.pop('id', None)
+        try:
+            with db.session.begin_nested():
+                show['id'] = db.session.execute(Show.__table__.insert(), show).inserted_primary_key[0]
+            inserted.append(show)
+        except IntegrityError as error:
+            errors = booking_errors(error)
+            if errors is None:
+                raise
+            reject(number, errors)
+    return inserted
+
+def import_shows(rows, chunk, reject):
+    # Validate and insert shows, then recount the touched venues and artists
+    imported = 0
+    for batch in chunks(rows, chunk):
+        shows = insert_shows(validate_shows(batch, reject), reject)
+        if not shows:
+            db.session.rollback()
+            continue
+
+        venue_ids = {show['venueid'] for show in shows}
+        artist_ids = {show['artistid'] for show in shows}
+        recount(venue_ids, artist_ids)
+        db.session.commit()
+        cache.invalidate(*show_cache_tags(venue_ids, artist_ids, {show_side(show['start_time']) for show in shows}))
+        imported += len(shows)
+    return imported
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+import_cli = AppGroup('import', help='Bulk import venues, artists or shows from CSV or NDJSON.')
+
+def run_import(kind, file, fmt, chunk):
+    if fmt is None:
+        fmt = 'ndjson' if file.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+    rejected = 0
+    def reject(number, errors):
+        nonlocal rejected
+        rejected += 1
+        click.echo(f'line {number}: {format_errors(errors)}', err=True)
+
+    started = time.perf_counter()
+    rows = read_rows(file, fmt)
+    if kind == 'shows':
+        imported = import_shows(rows, chunk, reject)
+    else:
+        imported = import_entities(kind, rows, chunk, reject)
+        refresh_genre_counts([genre_id for genre_id, in db.session.query(Genre.id)])
+        db.session.commit()
+        cache.invalidate(kind)
+    elapsed = time.perf_counter() - started
+
+    click.echo(f'Imported {imported} {kind}, rejected {rejected} in {elapsed:.1f}s '
+               f'({(imported + rejected) / max(elapsed, 1e-6):.0f} rows/s)')
+
+def import_command(kind):
+    @import_cli.command(kind, help=f'Import {kind} from a CSV or NDJSON file (- for stdin).')
+    @click.argument('file', type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Input format, by default from the file extension.')
+    @click.option('--chunk', default=1000, show_default=True, help='Rows per insert and transaction.')
+    def command(file, fmt, chunk):
+        run_import(kind, file, fmt, chunk)
+    return command
+
+for kind in ('venues', 'artists', 'shows'):
+    import_command(kind)
@@ -0,0 +1,139 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+import re
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Query Stats.
+#----------------------------------------------------------------------------#
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+def fingerprint(statement):
+    # Statements are already parameterized, so collapsing whitespace and
+    # literal IN lists is enough to spot the same query run repeatedly
+    statement = re.sub(r'\s+', ' ', statement).strip()
+    return re.sub(r'\bIN \([^)]*\)', 'IN (...)', statement)
+
+class QueryStats:
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold):
+        # Statements run at least threshold times, likely N+1 loops
+        return [(statement, count) for statement, count in self.fingerprints.most_common() if count >= threshold]
+
+_local = threading.local()
+
+def active_stats():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_start'].pop()
+    for stats in active_stats():
+        stats.record(statement, duration)
+
+@contextmanager
+def track_queries():
+    # Collect stats for every statement run inside the block, on this thread
+    stats = QueryStats()
+    active_stats().append(stats)
+    try:
+        yield stats
+    finally:
+        active_stats().remove(stats)
+
+@contextmanager
+def untracked():
+    # Statements run inside the block, e.g. session setup, count nowhere
+    stack = active_stats()
+    saved = stack[:]
+    del stack[:]
+    try:
+        yield
+    finally:
+        stack[:] = saved
+
+def endpoint_budget(app, endpoint):
+    # Statements endpoint may run per request, None when unlimited
+    return app.config['QUERY_BUDGETS'].get(endpoint, app.config['QUERY_BUDGET'])
+
+@contextmanager
+def query_budget(max_statements):
+    # Test helper: fail if the block runs more than max_statements queries
+    #   with query_budget(endpoint_budget(app, 'venues')):
+    #       client.get('/venues')
+    with track_queries() as stats:
+        yield stats
+    if stats.count > max_statements:
+        raise QueryBudgetExceeded(describe(stats, max_statements))
+
+def describe(stats, budget):
+    lines = [f'{stats.count} queries run, budget is {budget}']
+    lines += [f'  {count}x {statement}' for statement, count in stats.repeated(2)]
+    return '\n'.join(lines)
+
+#----------------------------------------------------------------------------#
+# Per Request Instrumentation.
+#----------------------------------------------------------------------------#
+
+def init_app(app):
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+        active_stats().append(g.query_stats)
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        active_stats().remove(stats)
+
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+        )
+
+        # N+1 detection
+        for statement, count in stats.repeated(app.config['QUERY_REPEAT_THRESHOLD']):
+            app.logger.warning('Statement ran %d times in %s %s: %s', count, request.method, request.path, statement)
+
+        # Query budget, per endpoint or default. Only logged: the view has
+        # committed by now, tests enforce budgets with query_budget()
+        budget = endpoint_budget(app, request.endpoint)
+        if budget is not None and stats.count > budget:
+            app.logger.warning(f'{request.method} {request.path}: ' + describe(stats, budget))
+        return response
+
+    @app.teardown_request
+    def clear_query_stats(exc):
+        # after_request is skipped on unhandled errors
+        stats = g.pop('query_stats', None)
+        if stats is not None and stats in active_stats():
+            active_stats().remove(stats)
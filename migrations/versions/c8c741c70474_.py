@@ -0,0 +1,53 @@
+"""name search indexes
+
+Revision ID: c8c741c70474
+Revises: b6eb9c40d5af
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8c741c70474'
+down_revision = 'b6eb9c40d5af'
+branch_labels = None
+depends_on = None
+
+
+def sqlite_fts(table):
+    return [
+        f"CREATE VIRTUAL TABLE {table}_fts USING fts5(name, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {table}_fts(rowid, name) VALUES (new.id, new.name); END",
+        f"CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {table}_fts({table}_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+        f"CREATE TRIGGER {table}_fts_update AFTER UPDATE OF name ON {table} BEGIN "
+        f"INSERT INTO {table}_fts({table}_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+        f"INSERT INTO {table}_fts(rowid, name) VALUES (new.id, new.name); END",
+        f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')",
+    ]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_venue_name_trgm', 'venue', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+        op.create_index('ix_artist_name_trgm', 'artist', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    elif dialect == 'sqlite':
+        for table in ('venue', 'artist'):
+            for statement in sqlite_fts(table):
+                op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_artist_name_trgm', table_name='artist')
+        op.drop_index('ix_venue_name_trgm', table_name='venue')
+    elif dialect == 'sqlite':
+        for table in ('venue', 'artist'):
+            for trigger in ('insert', 'delete', 'update'):
+                op.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{trigger}')
+            op.execute(f'DROP TABLE IF EXISTS {table}_fts')
@@ -2,18 +2,82 @@
 # Imports.
 #----------------------------------------------------------------------------#
 
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from flask import g, has_app_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm, DDL
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+from forms import genre_choices
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-db = SQLAlchemy()
+class RoutingSession(SignallingSession):
+    # Reads go to g.replica when the request picked one, see replicas.py.
+    # A flush or bulk write sends it and the rest of the request to the primary
+    def get_bind(self, mapper=None, clause=None):
+        if has_app_context() and g.get('replica') is not None:
+            if not self._flushing and not isinstance(clause, UpdateBase):
+                return g.replica
+            g.replica = None
+        return super().get_bind(mapper, clause)
+
+# create_engine() arguments set from config, for server databases
+POOL_OPTIONS = {
+    'pool_size': 'DB_POOL_SIZE',
+    'max_overflow': 'DB_MAX_OVERFLOW',
+    'pool_timeout': 'DB_POOL_TIMEOUT',
+    'pool_recycle': 'DB_POOL_RECYCLE',
+    'pool_pre_ping': 'DB_POOL_PRE_PING',
+}
+
+def pool_options(app, sa_url):
+    # POOL_OPTIONS for the database at sa_url; sqlite keeps the pools
+    # Flask-SQLAlchemy picks for files and memory
+    if sa_url.drivername.startswith('sqlite'):
+        return {}
+    return {option: app.config[key] for option, key in POOL_OPTIONS.items()}
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        options.update(pool_options(app, sa_url))
+        return super().apply_driver_hacks(app, sa_url, options)
+
+db = RoutingSQLAlchemy()
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+venue_genre = db.Table('venue_genre',
+    db.Column('venueid', db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genreid', db.Integer, db.ForeignKey('genre.id'), primary_key=True),
+    # Genre browse: venues of a genre straight from the index
+    db.Index('ix_venue_genre_genreid_venueid', 'genreid', 'venueid')
+)
+
+artist_genre = db.Table('artist_genre',
+    db.Column('artistid', db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genreid', db.Integer, db.ForeignKey('genre.id'), primary_key=True),
+    # Genre browse: artists of a genre straight from the index
+    db.Index('ix_artist_genre_genreid_artistid', 'genreid', 'artistid')
+)
+
+class Genre(db.Model):
+    __tablename__ = 'genre'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+    # Precomputed for facet display, see refresh_genre_counts in app.py
+    venue_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    artist_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    def __repr__(self):
+        return f'<Genre {self.id} {self.name}>'
+
 class City(db.Model):
     __tablename__ = 'city'
     id = db.Column(db.Integer, primary_key=True)
@@ -21,6 +85,13 @@ class City(db.Model):
     state = db.Column(db.String(120))
     venues = db.relationship('Venue', backref='city', lazy=True)
     artists = db.relationship('Artist', backref='city', lazy=True)
+    # Last write, validates cached pages; see conditional.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, server_default=db.func.now())
+    __table_args__ = (
+        # One row per city, state; target of get_city upserts
+        db.Index('ix_city_city_state', 'city', 'state', unique=True),
+        db.Index('ix_city_updated_at', 'updated_at'),
+    )
     def __repr__(self):
         return f'<City {self.id} {self.city}>'
 
@@ -33,11 +104,27 @@ class Venue(db.Model):
     phone = db.Column(db.String(120))
     website = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.String(500))
+    genres = db.relationship('Genre', secondary=venue_genre, order_by='Genre.name', lazy=True)
     seeking_talent = db.Column(db.Boolean(), default=False)
     seeking_description = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
-    shows = db.relationship('Show', backref=db.backref('venue'), lazy="joined")
+    # Denormalized, maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship('Show', backref=db.backref('venue'), lazy=True)
+    # Bumped on every update; edits carrying an older version are rejected
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Last write, validates cached pages; see conditional.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, server_default=db.func.now())
+    __table_args__ = (
+        # Trigram index for name search (postgres only, see Search Indexes)
+        db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # Keyset pagination of venues listing
+        db.Index('ix_venue_cityid_id', 'cityid', 'id'),
+        # Newest venue, for listing validators
+        db.Index('ix_venue_updated_at', 'updated_at'),
+    )
+    __mapper_args__ = {'version_id_col': version}
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
 
@@ -49,11 +136,25 @@ class Artist(db.Model):
     phone = db.Column(db.String(120))
     website = db.Column(db.String(120))
     facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.String(500))
+    genres = db.relationship('Genre', secondary=artist_genre, order_by='Genre.name', lazy=True)
     seeking_venue = db.Column(db.Boolean(), default=False)
     seeking_description = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
-    shows = db.relationship('Show', backref=db.backref('artist'), lazy="joined")
+    # Denormalized, maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship('Show', backref=db.backref('artist'), lazy=True)
+    # Bumped on every update; edits carrying an older version are rejected
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Last write, validates cached pages; see conditional.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, server_default=db.func.now())
+    __table_args__ = (
+        # Trigram index for name search (postgres only, see Search Indexes)
+        db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # Newest artist, for listing validators
+        db.Index('ix_artist_updated_at', 'updated_at'),
+    )
+    __mapper_args__ = {'version_id_col': version}
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
@@ -63,5 +164,159 @@ class Show(db.Model):
     artistid = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
     venueid = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    # Exclusive; no two shows of a venue or of an artist overlap, see Booking Checks
+    end_time = db.Column(db.DateTime, nullable=False)
+    # Occurrence of a recurring series, None for a one off show
+    seriesid = db.Column(db.Integer, db.ForeignKey('series.id', ondelete='SET NULL'))
+    # Last write, validates cached pages; see conditional.py
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, server_default=db.func.now())
+    __table_args__ = (
+        # Keyset pagination of shows listing
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        # A venue's or artist's shows by date; the included columns let
+        # postgres answer counts and date range joins from the index alone
+        db.Index('ix_show_venueid_start_time', 'venueid', 'start_time', postgresql_include=['id', 'artistid']),
+        db.Index('ix_show_artistid_start_time', 'artistid', 'start_time', postgresql_include=['id', 'venueid']),
+        # A series' shows still to come, for edits and cancellations
+        db.Index('ix_show_seriesid_start_time', 'seriesid', 'start_time'),
+        # Newest show, for listing validators
+        db.Index('ix_show_updated_at', 'updated_at'),
+    )
     def __repr__(self):
         return f'<Show {self.id} {self.start_time}>'
+
+class Series(db.Model):
+    # Recurring shows of one artist at one venue, see series.py
+    __tablename__ = 'series'
+    id = db.Column(db.Integer, primary_key=True)
+    artistid = db.Column(db.Integer, db.ForeignKey('artist.id'), nullable=False)
+    venueid = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
+    # RFC 5545 recurrence rule without DTSTART, e.g. FREQ=WEEKLY;BYDAY=FR;COUNT=26
+    rrule = db.Column(db.String(500), nullable=False)
+    # First show; every occurrence has its time of day and length
+    dtstart = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False)
+    # Occurrences starting before this are Show rows already
+    expanded_until = db.Column(db.DateTime, nullable=False)
+    cancelled = db.Column(db.Boolean(), nullable=False, default=False, server_default=db.false())
+    __table_args__ = (
+        # Series due for expansion
+        db.Index('ix_series_expanded_until', 'expanded_until'),
+    )
+    def __repr__(self):
+        return f'<Series {self.id} {self.rrule}>'
+
+#----------------------------------------------------------------------------#
+# Seed Data.
+#----------------------------------------------------------------------------#
+
+@event.listens_for(Genre.__table__, 'after_create')
+def seed_genres(target, connection, **kw):
+    connection.execute(target.insert(), [{'name': name} for name, _ in genre_choices])
+
+#----------------------------------------------------------------------------#
+# Search Indexes.
+#----------------------------------------------------------------------------#
+
+# Postgres: trigram indexes need the pg_trgm extension
+event.listen(
+    db.Model.metadata, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+# SQLite: external content FTS5 table kept in sync with triggers
+def fts_ddl(table):
+    return [
+        f"CREATE VIRTUAL TABLE {table}_fts USING fts5(name, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {table}_fts(rowid, name) VALUES (new.id, new.name); END",
+        f"CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {table}_fts({table}_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+        f"CREATE TRIGGER {table}_fts_update AFTER UPDATE OF name ON {table} BEGIN "
+        f"INSERT INTO {table}_fts({table}_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+        f"INSERT INTO {table}_fts(rowid, name) VALUES (new.id, new.name); END",
+        f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')",
+    ]
+
+for model in (Venue, Artist):
+    for statement in fts_ddl(model.__tablename__):
+        event.listen(model.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    event.listen(
+        model.__table__, 'before_drop',
+        DDL(f'DROP TABLE IF EXISTS {model.__tablename__}_fts').execute_if(dialect='sqlite')
+    )
+
+#----------------------------------------------------------------------------#
+# Booking Checks.
+#
+# A venue or an artist is never booked for two shows at once. Postgres
+# enforces this with gist exclusion constraints over tsrange(start, end).
+# SQLite uses triggers. Because a venue's shows never overlap, sorting them
+# by start also sorts them by end. So the only show that can overlap a new
+# one is the last show starting before the new one ends. The trigger finds
+# it with one seek on ix_show_<column>_start_time. Both checks run inside
+# the writing statement, so concurrent bookings can't both pass.
+#----------------------------------------------------------------------------#
+
+# Constraint (postgres) and trigger error (sqlite) names, per column
+OVERLAP_CHECKS = {
+    'venueid': 'ex_show_venueid_overlap',
+    'artistid': 'ex_show_artistid_overlap',
+}
+
+# Postgres: = on integers inside a gist index needs btree_gist
+event.listen(
+    db.Model.metadata, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql')
+)
+
+def overlap_ddl(column, dialect):
+    name = OVERLAP_CHECKS[column]
+    if dialect == 'postgresql':
+        return [
+            f"ALTER TABLE show ADD CONSTRAINT {name} EXCLUDE USING gist "
+            f"({column} WITH =, tsrange(start_time, end_time) WITH &&)"
+        ]
+    overlapping = (
+        f"(SELECT end_time FROM show WHERE {column} = new.{column} AND start_time < new.end_time "
+        f"AND id IS NOT new.id ORDER BY start_time DESC LIMIT 1) > new.start_time"
+    )
+    return [
+        f"CREATE TRIGGER {name}_insert BEFORE INSERT ON show WHEN {overlapping} "
+        f"BEGIN SELECT RAISE(ABORT, '{name}'); END",
+        f"CREATE TRIGGER {name}_update BEFORE UPDATE OF {column}, start_time, end_time ON show WHEN {overlapping} "
+        f"BEGIN SELECT RAISE(ABORT, '{name}'); END",
+    ]
+
+for column in OVERLAP_CHECKS:
+    for dialect in ('postgresql', 'sqlite'):
+        for statement in overlap_ddl(column, dialect):
+            event.listen(Show.__table__, 'after_create', DDL(statement).execute_if(dialect=dialect))
+
+def overlap_column(error):
+    # Column ('venueid' or 'artistid') a failed write double booked, else None
+    message = str(getattr(error, 'orig', error))
+    for column, name in OVERLAP_CHECKS.items():
+        if name in message:
+            return column
+    return None
+
+#----------------------------------------------------------------------------#
+# Update Stamps.
+#
+# updated_at is set on every INSERT and UPDATE, ORM or Core, by its column
+# default and onupdate. Two writes issue no UPDATE of their own: a change to
+# only the genres of a venue or artist, and a delete. The first stamps the
+# row itself, which also bumps its version; a delete stamps the city it was
+# in, so listings notice the row is gone.
+#----------------------------------------------------------------------------#
+
+@event.listens_for(Session, 'before_flush')
+def stamp_updates(session, flush_context, instances):
+    now = datetime.now()
+    for instance in session.dirty:
+        if isinstance(instance, (Venue, Artist)) and session.is_modified(instance):
+            instance.updated_at = now
+    for instance in session.deleted:
+        if isinstance(instance, (Venue, Artist)) and instance.city is not None:
+            instance.city.updated_at = now
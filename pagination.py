@@ -0,0 +1,74 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime
+from flask import request, url_for, abort
+from sqlalchemy import tuple_, DateTime
+
+#----------------------------------------------------------------------------#
+# Keyset Pagination.
+#----------------------------------------------------------------------------#
+
+def encode_cursor(values):
+    # Opaque url safe token for a row's sort key
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    # Sort key values from token, 400 on anything malformed
+    try:
+        values = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        abort(400)
+
+def cursor_url(arg, cursor):
+    # Url to current page with after/before cursor swapped
+    args = request.args.to_dict()
+    args.pop('after', None)
+    args.pop('before', None)
+    args[arg] = cursor
+    return url_for(request.endpoint, **request.view_args, **args)
+
+def keyset_paginate(query, columns, per_page):
+    # One page of query ordered by columns, positioned by ?after= or ?before=
+    # Cursors hold the sort key of the edge rows, so each page is an index seek
+    # and stays stable when rows are inserted behind or ahead of it
+    # Rows must expose each sort column under the column's key
+    after = request.args.get('after')
+    before = request.args.get('before')
+    key = tuple_(*columns)
+
+    if before:
+        query = query.filter(key < tuple_(*decode_cursor(before, columns))) \
+            .order_by(*[column.desc() for column in columns])
+    else:
+        if after:
+            query = query.filter(key > tuple_(*decode_cursor(after, columns)))
+        query = query.order_by(*columns)
+
+    # Fetch one extra row to know if there's another page
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+
+    def row_cursor(row):
+        return encode_cursor([getattr(row, column.key) for column in columns])
+
+    has_prev = more if before else bool(after)
+    has_next = bool(before) or more
+    pager = {
+        "prev": cursor_url('before', row_cursor(rows[0])) if rows and has_prev else None,
+        "next": cursor_url('after', row_cursor(rows[-1])) if rows and has_next else None
+    }
+    return rows, pager
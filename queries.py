@@ -0,0 +1,310 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import joinedload, selectinload
+from models import db, City, Venue, Artist, Show, Genre, venue_genre, artist_genre
+
+#----------------------------------------------------------------------------#
+# Query Shapes.
+#
+# One function per view, loading exactly what that view renders:
+# listings and details select plain columns, profiles load the entity with
+# its city and genres for editing but never its shows, and show lists are
+# column projections scoped to one venue or artist.
+#----------------------------------------------------------------------------#
+
+#  Listings
+#  ----------------------------------------------------------------
+
+def venue_listing():
+    # One row per venue with its city and stored upcoming show count
+    return db.session.query(
+        Venue.cityid,
+        Venue.id,
+        Venue.name,
+        City.city,
+        City.state,
+        Venue.upcoming_shows_count.label('num_upcoming_shows')
+    ).join(City, City.id == Venue.cityid)
+
+def artist_listing():
+    return db.session.query(Artist.id, Artist.name)
+
+def show_listing(today, start=None, end=None, city_name=None, state_code=None):
+    # Shows with the venue and artist columns the listing renders: upcoming
+    # by default, or in [start, end) at venues in a city when browsing
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.venueid.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Show.artistid.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Venue.id == Show.venueid) \
+     .join(Artist, Artist.id == Show.artistid)
+    if start is None:
+        query = query.filter(Show.start_time > today)
+    else:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    if city_name:
+        # City by ix_city_city_state, its venues by ix_venue_cityid_id, then
+        # each venue's date range by ix_show_venueid_start_time
+        query = query.join(City, City.id == Venue.cityid).filter(City.city == city_name)
+        if state_code:
+            query = query.filter(City.state == state_code)
+    return query
+
+def genre_venue_listing(genreid):
+    # Venues of genre straight from the association index
+    return db.session.query(venue_genre.c.venueid, Venue.id, Venue.name) \
+        .join(Venue, Venue.id == venue_genre.c.venueid) \
+        .filter(venue_genre.c.genreid == genreid)
+
+def genre_artist_listing(genreid):
+    # Artists of genre straight from the association index
+    return db.session.query(artist_genre.c.artistid, Artist.id, Artist.name) \
+        .join(Artist, Artist.id == artist_genre.c.artistid) \
+        .filter(artist_genre.c.genreid == genreid)
+
+#  Details
+#  ----------------------------------------------------------------
+
+def venue_detail(venue_id):
+    # Venue columns with city, state as one row
+    return db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.address,
+        City.city,
+        City.state,
+        Venue.phone,
+        Venue.website,
+        Venue.facebook_link,
+        Venue.seeking_talent,
+        Venue.seeking_description,
+        Venue.image_link,
+        Venue.past_shows_count,
+        Venue.upcoming_shows_count
+    ).join(City, City.id == Venue.cityid).filter(Venue.id == venue_id)
+
+def artist_detail(artist_id):
+    # Artist columns with city, state as one row
+    return db.session.query(
+        Artist.id,
+        Artist.name,
+        City.city,
+        City.state,
+        Artist.phone,
+        Artist.website,
+        Artist.facebook_link,
+        Artist.seeking_venue,
+        Artist.seeking_description,
+        Artist.image_link,
+        Artist.past_shows_count,
+        Artist.upcoming_shows_count
+    ).join(City, City.id == Artist.cityid).filter(Artist.id == artist_id)
+
+def venue_genre_names(venue_id):
+    return db.session.query(Genre.name) \
+        .join(venue_genre, venue_genre.c.genreid == Genre.id) \
+        .filter(venue_genre.c.venueid == venue_id) \
+        .order_by(Genre.name)
+
+def artist_genre_names(artist_id):
+    return db.session.query(Genre.name) \
+        .join(artist_genre, artist_genre.c.genreid == Genre.id) \
+        .filter(artist_genre.c.artistid == artist_id) \
+        .order_by(Genre.name)
+
+#  Profiles (edit forms and write handlers)
+#  ----------------------------------------------------------------
+
+def venue_profile():
+    # Venue with city and genres, no shows
+    return Venue.query.options(joinedload(Venue.city), selectinload(Venue.genres))
+
+def artist_profile():
+    # Artist with city and genres, no shows
+    return Artist.query.options(joinedload(Artist.city), selectinload(Artist.genres))
+
+#  Shows
+#  ----------------------------------------------------------------
+
+def split_shows(query, today):
+    # Past (latest first) and upcoming (soonest first) halves of a show query
+    return (
+        query.filter(Show.start_time <= today).order_by(Show.start_time.desc()),
+        query.filter(Show.start_time > today).order_by(Show.start_time)
+    )
+
+def venue_shows(venue_id, today):
+    # Past and upcoming shows of one venue with the artist columns rendered
+    return split_shows(db.session.query(
+        Show.artistid.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.start_time
+    ).join(Artist, Artist.id == Show.artistid).filter(Show.venueid == venue_id), today)
+
+def artist_shows(artist_id, today):
+    # Past and upcoming shows of one artist with the venue columns rendered
+    return split_shows(db.session.query(
+        Show.venueid.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+        Show.start_time
+    ).join(Venue, Venue.id == Show.venueid).filter(Show.artistid == artist_id), today)
+
+def venue_artist_ids(venue_id):
+    # Artists that have played or will play venue, with the venue's city;
+    # a venue without shows has one row with no artist
+    return db.session.query(Show.artistid, Venue.cityid).select_from(Venue) \
+        .outerjoin(Show, Show.venueid == Venue.id).filter(Venue.id == venue_id).distinct()
+
+def artist_venue_ids(artist_id):
+    # Venues artist has played or will play, with their cities
+    return db.session.query(Show.venueid, Venue.cityid).join(Venue, Venue.id == Show.venueid) \
+        .filter(Show.artistid == artist_id).distinct()
+
+def booked_shows(venue_ids, artist_ids, start, end):
+    # Shows of venue_ids or artist_ids overlapping [start, end)
+    return db.session.query(Show.venueid, Show.artistid, Show.start_time, Show.end_time) \
+        .filter(or_(Show.venueid.in_(venue_ids), Show.artistid.in_(artist_ids))) \
+        .filter(Show.start_time < end, Show.end_time > start)
+
+def city_ids(city_name, state_code=None):
+    # Cities called city_name, in state_code when given
+    query = db.session.query(City.id).filter(City.city == city_name)
+    if state_code:
+        query = query.filter(City.state == state_code)
+    return query
+
+def venue_city_ids(venue_ids):
+    return db.session.query(Venue.cityid).filter(Venue.id.in_(venue_ids)).distinct()
+
+#  Validators
+#  ----------------------------------------------------------------
+
+def latest(*columns):
+    # One row with max() of each updated_at column, answered from its index
+    return db.session.query(*[select(func.max(column)).scalar_subquery() for column in columns])
+
+def venue_listing_stamps():
+    return latest(Venue.updated_at, City.updated_at)
+
+def artist_listing_stamps():
+    return latest(Artist.updated_at, City.updated_at)
+
+def show_listing_stamps():
+    return latest(Show.updated_at, Venue.updated_at, Artist.updated_at)
+
+def venue_stamps(venue_id):
+    # The venue and its city, and the newest of its shows and their artists;
+    # no row for a missing venue
+    shows = select(func.max(Show.updated_at)).where(Show.venueid == venue_id).scalar_subquery()
+    artists = select(func.max(Artist.updated_at)).select_from(Show) \
+        .join(Artist, Artist.id == Show.artistid).where(Show.venueid == venue_id).scalar_subquery()
+    return db.session.query(Venue.updated_at, City.updated_at, shows, artists) \
+        .join(City, City.id == Venue.cityid).filter(Venue.id == venue_id)
+
+def artist_stamps(artist_id):
+    # The artist and its city, and the newest of its shows and their venues
+    shows = select(func.max(Show.updated_at)).where(Show.artistid == artist_id).scalar_subquery()
+    venues = select(func.max(Venue.updated_at)).select_from(Show) \
+        .join(Venue, Venue.id == Show.venueid).where(Show.artistid == artist_id).scalar_subquery()
+    return db.session.query(Artist.updated_at, City.updated_at, shows, venues) \
+        .join(City, City.id == Artist.cityid).filter(Artist.id == artist_id)
+
+#  Replica Lag
+#  ----------------------------------------------------------------
+#  Plain selects, run on a replica's or the primary's own connection
+
+STAMPED = (City, Venue, Artist, Show)
+
+def last_writes():
+    # Newest updated_at of each table
+    return select(*[select(func.max(model.updated_at)).scalar_subquery() for model in STAMPED])
+
+def writes_after(stamp):
+    # Oldest updated_at of each table newer than stamp
+    return select(*[
+        select(func.min(model.updated_at)).where(model.updated_at > stamp).scalar_subquery()
+        for model in STAMPED
+    ])
+
+#  Genres
+#  ----------------------------------------------------------------
+
+def genre_by_name(name):
+    return Genre.query.filter_by(name=name)
+
+def genre_facets():
+    return Genre.query.order_by(Genre.name)
+
+#  Exports
+#  ----------------------------------------------------------------
+
+def genre_list(link_table, link_column, entity_id):
+    # Comma separated genre names of the outer row, as a correlated subquery
+    if db.engine.dialect.name == 'postgresql':
+        names = func.string_agg(Genre.name, ',')
+    else:
+        names = func.group_concat(Genre.name, ',')
+    return select(names).where(Genre.id == link_table.c.genreid, link_column == entity_id) \
+        .scalar_subquery()
+
+def venue_export():
+    # Every venue in id order, named after the create form fields
+    return db.session.query(
+        Venue.id,
+        Venue.name,
+        City.city,
+        City.state,
+        Venue.address,
+        Venue.phone,
+        genre_list(venue_genre, venue_genre.c.venueid, Venue.id).label('genres'),
+        Venue.facebook_link,
+        Venue.website.label('website_link'),
+        Venue.image_link,
+        Venue.seeking_talent,
+        Venue.seeking_description,
+        Venue.upcoming_shows_count,
+        Venue.past_shows_count
+    ).join(City, City.id == Venue.cityid).order_by(Venue.id)
+
+def artist_export():
+    # Every artist in id order, named after the create form fields
+    return db.session.query(
+        Artist.id,
+        Artist.name,
+        City.city,
+        City.state,
+        Artist.phone,
+        genre_list(artist_genre, artist_genre.c.artistid, Artist.id).label('genres'),
+        Artist.facebook_link,
+        Artist.website.label('website_link'),
+        Artist.image_link,
+        Artist.seeking_venue,
+        Artist.seeking_description,
+        Artist.upcoming_shows_count,
+        Artist.past_shows_count
+    ).join(City, City.id == Artist.cityid).order_by(Artist.id)
+
+def show_export():
+    # Full show history in id order with both names
+    return db.session.query(
+        Show.id,
+        Show.venueid.label('venue_id'),
+        Show.artistid.label('artist_id'),
+        Show.start_time,
+        Show.end_time,
+        Venue.name.label('venue_name'),
+        Artist.name.label('artist_name')
+    ).join(Venue, Venue.id == Show.venueid) \
+        .join(Artist, Artist.id == Show.artistid) \
+        .order_by(Show.id)
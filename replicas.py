@@ -0,0 +1,142 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+import random
+import sqlite3
+import time
+from datetime import datetime
+from threading import Lock
+import click
+from flask import current_app, g, request, session
+from flask.cli import AppGroup
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from models import db
+import queries
+
+#----------------------------------------------------------------------------#
+# Read Replicas.
+#
+# Requests to the read only endpoints in REPLICA_ENDPOINTS (searches are
+# posted too) read from a replica in SQLALCHEMY_REPLICA_URIS, picked at
+# random among those no more than REPLICA_MAX_LAG seconds behind; with none
+# fit they read from the primary. Everything else, and any flush, goes to
+# the primary (RoutingSession in models.py). A browser that just wrote reads
+# from the primary for REPLICA_STICKY_SECONDS, so the page it is redirected
+# to shows its edit.
+#
+# Lag is measured from the updated_at stamps every write leaves: the age of
+# the oldest write on the primary the replica hasn't got yet, 0 when it has
+# them all. It is checked at most every REPLICA_LAG_INTERVAL seconds per
+# process, outside the request's query stats.
+#----------------------------------------------------------------------------#
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+_lags = {}
+_lock = Lock()
+
+def replica_binds(app):
+    # Bind keys of the replicas, in SQLALCHEMY_BINDS order
+    return [key for key in (app.config['SQLALCHEMY_BINDS'] or {}) if key.startswith('replica:')]
+
+def measure_lag(replica, primary):
+    # Seconds since the oldest write on primary missing from replica
+    with replica.connect() as conn:
+        seen = [stamp for stamp in conn.execute(queries.last_writes()).first() if stamp is not None]
+    with primary.connect() as conn:
+        missing = [stamp for stamp in conn.execute(queries.writes_after(max(seen, default=datetime.min))).first()
+                   if stamp is not None]
+    if not missing:
+        return 0.0
+    return max((datetime.now() - min(missing)).total_seconds(), 0.0)
+
+def replica_lag(app, key, refresh=False):
+    # Last measured lag of replica key, None when it couldn't be reached
+    now = time.monotonic()
+    with _lock:
+        lag, checked = _lags.get(key, (None, None))
+    if not refresh and checked is not None and now - checked < app.config['REPLICA_LAG_INTERVAL']:
+        return lag
+    try:
+        lag = measure_lag(db.get_engine(app, key), db.get_engine(app))
+    except SQLAlchemyError as e:
+        app.logger.warning('Replica %s unavailable: %s', key, e)
+        lag = None
+    with _lock:
+        _lags[key] = (lag, now)
+    return lag
+
+def pick_replica(app):
+    # Engine of a replica fit to read from, else None for the primary
+    fit = []
+    for key in replica_binds(app):
+        lag = replica_lag(app, key)
+        if lag is not None and lag <= app.config['REPLICA_MAX_LAG']:
+            fit.append(key)
+    return db.get_engine(app, random.choice(fit)) if fit else None
+
+def init_app(app):
+    # Replicas become binds, so they share the primary's engine options
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for number, uri in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or []):
+        binds[f'replica:{number}'] = uri
+    app.config['SQLALCHEMY_BINDS'] = binds
+    if not replica_binds(app):
+        return
+
+    @app.before_request
+    def route_reads():
+        if request.endpoint not in app.config['REPLICA_ENDPOINTS']:
+            return
+        if session.get('replica_after', 0) > time.time():
+            return
+        g.replica = pick_replica(app)
+        if g.replica is not None:
+            # Cached results built from it may predate a purge by this much
+            g.replica_staleness = app.config['REPLICA_MAX_LAG'] + app.config['REPLICA_LAG_INTERVAL']
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method not in SAFE_METHODS and request.endpoint not in app.config['REPLICA_ENDPOINTS'] \
+                and response.status_code < 400:
+            session['replica_after'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+replicas_cli = AppGroup('replicas', help='Check and sync read replicas.')
+
+@replicas_cli.command('status')
+def status_command():
+    '''Print the lag of every replica.'''
+    keys = replica_binds(current_app)
+    if not keys:
+        raise click.UsageError('SQLALCHEMY_REPLICA_URIS is empty')
+    for key in keys:
+        lag = replica_lag(current_app, key, refresh=True)
+        url = db.get_engine(current_app, key).url
+        click.echo(f'{key} {url!r}: ' + ('unavailable' if lag is None else f'{lag:.1f}s behind'))
+
+@replicas_cli.command('sync')
+def sync_command():
+    '''Copy a sqlite primary onto sqlite replicas, for local two database runs.'''
+    primary = make_url(current_app.config['SQLALCHEMY_DATABASE_URI'])
+    keys = replica_binds(current_app)
+    replicas = [make_url(current_app.config['SQLALCHEMY_BINDS'][key]) for key in keys]
+    if primary.get_backend_name() != 'sqlite' or any(url.get_backend_name() != 'sqlite' for url in replicas):
+        raise click.UsageError('Only sqlite files can be synced; replicate other databases with their own tools')
+    source = sqlite3.connect(primary.database)
+    try:
+        for key, url in zip(keys, replicas):
+            target = sqlite3.connect(url.database)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+            click.echo(f'{key}: copied {primary.database} to {url.database}')
+    finally:
+        source.close()
@@ -0,0 +1,47 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+from sqlalchemy import func, table, column, literal_column
+from models import db
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Trigram indexes can't serve terms shorter than this
+MIN_INDEXED_TERM = 3
+
+def escape_like(term):
+    # Escape LIKE wildcards so user input matches literally
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def name_search(model, term):
+    # Query of (id, name) matching term, ranked best first
+    term = term.strip()
+    dialect = db.engine.dialect.name
+    query = db.session.query(model.id, model.name)
+
+    if dialect == 'sqlite' and len(term) >= MIN_INDEXED_TERM:
+        # FTS5 trigram table, ranked by bm25
+        fts = table(model.__tablename__ + '_fts', column('rowid'), column('rank'))
+        match = '"' + term.replace('"', '""') + '"' # Quote as a single FTS phrase
+        return query.join(fts, fts.c.rowid == model.id) \
+            .filter(literal_column(fts.name).op('MATCH')(match)) \
+            .order_by(fts.c.rank, model.id)
+
+    # Case insensitive partial match, served by the trigram index on postgres
+    query = query.filter(model.name.ilike('%' + escape_like(term) + '%', escape='\\'))
+    if dialect == 'postgresql':
+        return query.order_by(func.similarity(model.name, term).desc(), model.id)
+    return query.order_by(model.name, model.id)
+
+def search(model, term, page=1, per_page=20, count_only=False):
+    # Count and one page of results for term
+    query = name_search(model, term)
+    count = query.order_by(None).count()
+    if count_only:
+        return count, []
+    page = max(page, 1)
+    results = query.limit(per_page).offset((page - 1) * per_page).all()
+    return count, results
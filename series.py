@@ -0,0 +1,208 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+from datetime import date, datetime, time, timedelta
+from itertools import takewhile
+import click
+from dateutil.rrule import rrulestr
+from flask import current_app
+from flask.cli import AppGroup
+from models import db, Series, Show
+from counters import recount
+from cache import cache, show_cache_tags
+from importer import NOT_AN_OBJECT, chunks, validate_shows, insert_shows
+
+#----------------------------------------------------------------------------#
+# Recurring Shows.
+#
+# A series books one artist at one venue by an RFC 5545 recurrence rule,
+# e.g. FREQ=WEEKLY;BYDAY=FR;UNTIL=20270430T000000 for a residency, starting
+# with a first show whose time of day and length every occurrence repeats.
+# A tour is a series per venue. Occurrences become Show rows only up to
+# SERIES_WINDOW_DAYS ahead, every due series at once in one bulk insert;
+# `flask series extend` slides the window forward and runs daily next to
+# `flask counters roll`. Editing or cancelling a series deletes its shows
+# still to come with one statement and, for an edit, expands the new rule
+# in one insert. Past shows stay as they were.
+#----------------------------------------------------------------------------#
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+
+# Every occurrence starts at the first show's time of day
+TIME_PARTS = ('BYHOUR', 'BYMINUTE', 'BYSECOND')
+
+# Frequencies that may pick days of the month or year (RFC 5545, and not
+# daily or weekly either: such a rule matching no date is searched for day
+# by day up to year 9999, monthly and yearly ones far faster)
+DAY_PARTS = {
+    'BYMONTHDAY': ('MONTHLY', 'YEARLY'),
+    'BYSETPOS': ('MONTHLY', 'YEARLY'),
+    'BYYEARDAY': ('YEARLY',),
+    'BYWEEKNO': ('YEARLY',),
+}
+
+# Most shows one series gets per expansion; at most one a day, so a window
+# of SERIES_WINDOW_DAYS only reaches it after a long gap between extends
+MAX_OCCURRENCES = 1000
+
+def parse_rule(rule, dtstart):
+    # dateutil rrule from rule text; ValueError when malformed, when it sets
+    # its own DTSTART or time of day, or repeats more often than daily
+    rule = rule.strip()
+    if rule.upper().startswith('RRULE:'):
+        rule = rule[len('RRULE:'):]
+    parts = dict(part.split('=', 1) for part in rule.upper().split(';') if '=' in part)
+    if 'DTSTART' in rule.upper():
+        raise ValueError('The first show is start_time, not DTSTART')
+    if parts.get('FREQ') not in FREQUENCIES:
+        raise ValueError('FREQ must be one of ' + ', '.join(FREQUENCIES))
+    for name in ('INTERVAL', 'COUNT'):
+        if name in parts and not (parts[name].isdigit() and int(parts[name]) >= 1):
+            raise ValueError(f'{name} must be a whole number, 1 or more')
+    for name in TIME_PARTS:
+        if name in parts:
+            raise ValueError(f'The time of day is start_time\'s, not {name}')
+    for name, frequencies in DAY_PARTS.items():
+        if name in parts and parts['FREQ'] not in frequencies:
+            raise ValueError(f'{name} needs FREQ={" or ".join(frequencies)}')
+    return rrulestr(rule, dtstart=dtstart)
+
+def horizon():
+    # End of the expansion window, midnight SERIES_WINDOW_DAYS from today
+    days = current_app.config['SERIES_WINDOW_DAYS']
+    return datetime.combine(date.today() + timedelta(days=days), time())
+
+def validate_series(row):
+    # (series columns, None) from a row, or (None, field errors); the first
+    # show is checked like any other show
+    if not isinstance(row, dict):
+        return None, NOT_AN_OBJECT
+    errors = {}
+    first = {key: row[key] for key in ('venue_id', 'artist_id', 'start_time') if key in row}
+    first = validate_shows([(0, first)], lambda number, show_errors: errors.update(show_errors))
+    try:
+        duration = int(row.get('duration_minutes') or current_app.config['SHOW_DURATION_MINUTES'])
+        if duration <= 0:
+            raise ValueError(duration)
+    except (TypeError, ValueError):
+        errors['duration_minutes'] = ['Must be a positive number of minutes']
+    if not row.get('rrule'):
+        errors['rrule'] = ['This field is required.']
+    elif first:
+        dtstart = first[0][1]['start_time']
+        try:
+            first_show = parse_rule(str(row['rrule']), dtstart).after(dtstart, inc=True)
+            # Nor would every expansion search to year 9999 for no show
+            if first_show is None or first_show > dtstart + timedelta(days=366):
+                errors['rrule'] = ['No show within a year of start_time']
+        except (TypeError, ValueError) as e:
+            errors['rrule'] = [str(e) or 'Not a recurrence rule']
+    if errors:
+        return None, errors
+
+    show = first[0][1]
+    return {
+        'venueid': show['venueid'],
+        'artistid': show['artistid'],
+        'rrule': str(row['rrule']).strip(),
+        'dtstart': show['start_time'],
+        'duration_minutes': duration
+    }, None
+
+def occurrences(series, until):
+    # Show rows for the first MAX_OCCURRENCES occurrences of series starting
+    # in [expanded_until, until), and how far that expanded it
+    rule = parse_rule(series.rrule, series.dtstart)
+    length = timedelta(minutes=series.duration_minutes)
+    starts = list(takewhile(lambda start: start < until,
+                            rule.xafter(series.expanded_until, count=MAX_OCCURRENCES, inc=True)))
+    if len(starts) == MAX_OCCURRENCES:
+        # Carry on after the last one next time
+        until = starts[-1] + timedelta(microseconds=1)
+    return [
+        {
+            'venueid': series.venueid,
+            'artistid': series.artistid,
+            'seriesid': series.id,
+            'start_time': start,
+            'end_time': start + length
+        }
+        for start in starts
+    ], until
+
+def expand(series_list, until, venue_ids=(), artist_ids=()):
+    # Insert the occurrences of every series up to until with one bulk insert.
+    # Occurrences that would double book are skipped, not retried later;
+    # venue_ids and artist_ids are recounted along with the shows' own.
+    # Returns (inserted shows, [(skipped show, errors)])
+    shows = []
+    expanded = {}
+    for series in series_list:
+        series_shows, reached = occurrences(series, until)
+        shows += series_shows
+        expanded.setdefault(reached, []).append(series.id)
+    skipped = []
+    inserted = insert_shows(list(enumerate(shows)), lambda number, errors: skipped.append((shows[number], errors)))
+    # One update for all series, unless some were cut short
+    for reached, ids in expanded.items():
+        db.session.query(Series).filter(Series.id.in_(ids), Series.expanded_until < reached) \
+            .update({Series.expanded_until: reached}, synchronize_session=False)
+    recount({show['venueid'] for show in inserted} | set(venue_ids),
+            {show['artistid'] for show in inserted} | set(artist_ids))
+    return inserted, skipped
+
+def clear(series, after):
+    # Delete the shows of series starting after after, in one statement
+    return db.session.query(Show).filter(Show.seriesid == series.id, Show.start_time > after) \
+        .delete(synchronize_session=False)
+
+def reschedule(series, values):
+    # Replace the shows still to come of series with those of its new values;
+    # returns (deleted count, inserted shows, skipped)
+    now = datetime.now()
+    old_venueid, old_artistid = series.venueid, series.artistid
+    deleted = clear(series, now)
+    for key, value in values.items():
+        setattr(series, key, value)
+    series.expanded_until = now
+    db.session.flush()
+    inserted, skipped = expand([series], horizon(), {old_venueid}, {old_artistid})
+    return deleted, inserted, skipped
+
+def cancel(series):
+    # Delete the shows still to come of series and stop expanding it
+    deleted = clear(series, datetime.now())
+    series.cancelled = True
+    recount({series.venueid}, {series.artistid})
+    return deleted
+
+def series_cache_tags(*series_list):
+    # Series only ever change shows still to come
+    return show_cache_tags({series.venueid for series in series_list},
+                           {series.artistid for series in series_list}, ['shows:upcoming'])
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+series_cli = AppGroup('series', help='Expand recurring shows.')
+
+@series_cli.command('extend')
+@click.option('--chunk', default=500, show_default=True, help='Series expanded per transaction.')
+def extend_command(chunk):
+    '''Expand every live series up to SERIES_WINDOW_DAYS ahead.'''
+    until = horizon()
+    due = Series.query.filter(Series.cancelled.is_(False), Series.expanded_until < until) \
+        .order_by(Series.id).all()
+    created = 0
+    for batch in chunks(due, chunk):
+        inserted, skipped = expand(batch, until)
+        for show, errors in skipped:
+            for messages in errors.values():
+                click.echo(f'series {show["seriesid"]} {show["start_time"]}: {"; ".join(messages)}', err=True)
+        tags = series_cache_tags(*batch)
+        db.session.commit()
+        cache.invalidate(*tags)
+        created += len(inserted)
+    click.echo(f'Expanded {len(due)} series up to {until:%Y-%m-%d}, {created} shows created')
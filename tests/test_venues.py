@@ -0,0 +1,37 @@
+#----------------------------------------------------------------------------#
+# Venue listing query count.
+#
+# GET /venues must run the same statements whatever the catalog size, so a
+# per venue query (N+1) creeping into the listing fails here.
+#
+#   python -m pytest tests
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+
+os.environ['FYYUR_ENV'] = 'test'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from catalog import create_app, generate
+from cache import cache
+from instrumentation import query_budget, track_queries
+
+# Shows in the small and the large catalog, 20 and 100 venues
+SIZES = (1000, 5000)
+
+def listing_statements(tmp_path, shows):
+    # Statements GET /venues runs, uncached, on a file catalog of shows
+    app = create_app('sqlite:///' + str(tmp_path / f'catalog-{shows}.db'))
+    with app.app_context():
+        generate(shows, log=lambda message: None)
+    cache.invalidate('venues')
+    client = app.test_client()
+    with query_budget(app.config['QUERY_BUDGETS']['venues']), track_queries() as stats:
+        response = client.get('/venues')
+    assert response.status_code == 200
+    return stats.count
+
+def test_venue_listing_statements_do_not_grow(tmp_path):
+    small, large = [listing_statements(tmp_path, shows) for shows in SIZES]
+    assert small == large
@@ -0,0 +1,127 @@
+#----------------------------------------------------------------------------#
+# Write query counts.
+#
+# Every write endpoint, html and API, runs within its query budget in
+# config.py, in its costliest usual case: new cities, changed genres and
+# shows that recount their venues and artists.
+#
+#   python -m pytest tests
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+
+os.environ['FYYUR_ENV'] = 'test'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import pytest
+from catalog import create_app, generate
+import cities
+from cities import CityCache
+from cache import cache
+from instrumentation import endpoint_budget, query_budget
+from models import db, City, Venue, Artist
+
+VENUE_FORM = {
+    'name': 'Edited Venue', 'address': '1 New St', 'phone': '555-555-5555',
+    'genres': ['Jazz', 'Folk'], 'facebook_link': 'https://facebook.com/edited',
+}
+ARTIST_FORM = {
+    'name': 'Edited Artist', 'phone': '555-555-5555',
+    'genres': ['Jazz'], 'facebook_link': 'https://facebook.com/edited',
+    'image_link': 'https://example.com/edited.jpg',
+}
+NEW_CITY = {'city': 'Brand New Town', 'state': 'NV'}
+
+# (endpoint, method, url, body) of writes needing nothing but the catalog
+WRITES = [
+    ('create_venue_submission', 'POST', '/venues/create', {**VENUE_FORM, **NEW_CITY}),
+    ('create_artist_submission', 'POST', '/artists/create', {**ARTIST_FORM, **NEW_CITY}),
+    ('create_show_submission', 'POST', '/shows/create',
+     {'venue_id': '1', 'artist_id': '1', 'start_time': '2031-01-01 20:00:00'}),
+    ('api.create_venue', 'POST', '/api/v1/venues', {**VENUE_FORM, **NEW_CITY}),
+    ('api.create_artist', 'POST', '/api/v1/artists', {**ARTIST_FORM, **NEW_CITY}),
+    ('api.edit_venue', 'PUT', '/api/v1/venues/1', {**VENUE_FORM, **NEW_CITY}),
+    ('api.edit_artist', 'PUT', '/api/v1/artists/1', {**ARTIST_FORM, **NEW_CITY}),
+    ('api.patch_venue', 'PATCH', '/api/v1/venues/1', {**NEW_CITY, 'genres': ['Blues'], 'version': 1}),
+    ('api.patch_artist', 'PATCH', '/api/v1/artists/1', {**NEW_CITY, 'genres': ['Blues'], 'version': 1}),
+    ('api.batch_venues', 'POST', '/api/v1/venues/batch',
+     [{**VENUE_FORM, **NEW_CITY}, {**VENUE_FORM, 'city': 'Other New Town', 'state': 'NV'}]),
+    ('api.batch_artists', 'POST', '/api/v1/artists/batch',
+     [{**ARTIST_FORM, **NEW_CITY}, {**ARTIST_FORM, 'city': 'Other New Town', 'state': 'NV'}]),
+    ('api.create_show', 'POST', '/api/v1/shows',
+     {'venue_id': 1, 'artist_id': 1, 'start_time': '2031-01-01T20:00:00'}),
+    ('api.batch_shows', 'POST', '/api/v1/shows/batch', [
+        {'venue_id': 1, 'artist_id': 1, 'start_time': '2031-01-01T20:00:00'},
+        {'venue_id': 2, 'artist_id': 2, 'start_time': '2031-01-01T20:00:00'},
+    ]),
+]
+SERIES = {'venue_id': 1, 'artist_id': 1, 'start_time': '2031-01-03T20:00:00', 'rrule': 'FREQ=WEEKLY;COUNT=10'}
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app('sqlite:///' + str(tmp_path / 'catalog.db'))
+    with app.app_context():
+        generate(100, log=lambda message: None)
+    # A database of its own, so nothing cached from another test's
+    cities.city_cache = CityCache(app.config['CITY_CACHE_SIZE'])
+    cache.init_app(app)
+    return app
+
+def send(client, method, url, body):
+    # Form posts to the html routes, JSON to the API
+    if url.startswith('/api/'):
+        return client.open(url, method=method, json=body)
+    return client.open(url, method=method, data=body)
+
+def within_budget(app, endpoint, method, url, body=None):
+    # The response to one write, failing if it ran over endpoint's budget
+    assert endpoint in app.view_functions
+    client = app.test_client()
+    with query_budget(endpoint_budget(app, endpoint)):
+        response = send(client, method, url, body)
+    assert response.status_code < 400, response.get_data(as_text=True)
+    assert b'could not be' not in response.data
+    return response
+
+def city_of(app, model, entity_id):
+    with app.app_context():
+        return db.session.query(City.city, City.state).join(model, model.cityid == City.id) \
+            .filter(model.id == entity_id).one()
+
+@pytest.mark.parametrize('endpoint, method, url, body', WRITES, ids=[write[0] for write in WRITES])
+def test_write_within_budget(app, endpoint, method, url, body):
+    within_budget(app, endpoint, method, url, body)
+
+def test_edit_venue_to_new_city(app):
+    within_budget(app, 'edit_venue_submission', 'POST', '/venues/1/edit', {**VENUE_FORM, **NEW_CITY})
+    assert tuple(city_of(app, Venue, 1)) == ('Brand New Town', 'NV')
+
+def test_edit_artist_to_new_city(app):
+    within_budget(app, 'edit_artist_submission', 'POST', '/artists/1/edit', {**ARTIST_FORM, **NEW_CITY})
+    assert tuple(city_of(app, Artist, 1)) == ('Brand New Town', 'NV')
+
+def test_delete_venue_within_budget(app):
+    # A venue without shows, those with shows can't be deleted
+    venue = app.test_client().post('/api/v1/venues', json={**VENUE_FORM, **NEW_CITY}).get_json()
+    within_budget(app, 'delete_venue', 'DELETE', f'/venues/{venue["id"]}')
+
+def test_series_writes_within_budget(app):
+    series = within_budget(app, 'api.create_series', 'POST', '/api/v1/series', SERIES).get_json()
+    url = f'/api/v1/series/{series["id"]}'
+    within_budget(app, 'api.patch_series', 'PATCH', url, {'venue_id': 2, 'artist_id': 2})
+    within_budget(app, 'api.cancel_series', 'DELETE', url)
+
+def test_put_losing_to_concurrent_edit_conflicts(app, monkeypatch):
+    # Another writer bumps the version between the PUT's read and its UPDATE
+    import api
+    apply_venue_form = api.apply_venue_form
+    def concurrent(venue, form):
+        with db.engine.begin() as connection:
+            connection.execute(Venue.__table__.update().where(Venue.id == venue.id).values(version=Venue.version + 1))
+        apply_venue_form(venue, form)
+    monkeypatch.setattr(api, 'apply_venue_form', concurrent)
+    response = app.test_client().put('/api/v1/venues/1', json={**VENUE_FORM, **NEW_CITY})
+    assert response.status_code == 409
+    assert response.get_json()['version'] == 2
+    assert city_of(app, Venue, 1) != ('Brand New Town', 'NV')
@@ -0,0 +1,94 @@
+#----------------------------------------------------------------------------#
+# View Models.
+#
+# Immutable, slotted records built straight from query rows. Views hand
+# these to templates instead of ORM instances, so rendering never touches
+# the session and the same objects can be serialized as JSON.
+#----------------------------------------------------------------------------#
+
+class ViewModel:
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.get(name))
+
+    @classmethod
+    def from_row(cls, row, **extra):
+        # Pick slot values from a query row by column label, extra wins
+        mapping = row._mapping
+        return cls(**{name: extra[name] if name in extra else mapping.get(name) for name in cls.__slots__})
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    # Pickle support for shared caches, bypassing the immutability guard
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+    def as_dict(self):
+        # Plain dict, nested view models included
+        return {name: as_plain(getattr(self, name)) for name in self.__slots__}
+
+def as_plain(value):
+    if isinstance(value, ViewModel):
+        return value.as_dict()
+    if isinstance(value, (list, tuple)):
+        return [as_plain(item) for item in value]
+    return value
+
+#  Shows
+#  ----------------------------------------------------------------
+
+class ShowSummary(ViewModel):
+    # One show as listed on /shows and the venue/artist pages,
+    # fields for the side not being viewed are None
+    __slots__ = (
+        'venue_id', 'venue_name', 'venue_image_link',
+        'artist_id', 'artist_name', 'artist_image_link',
+        'start_time'
+    )
+
+#  Venues
+#  ----------------------------------------------------------------
+
+class VenueSummary(ViewModel):
+    __slots__ = ('id', 'name', 'num_upcoming_shows')
+
+class CityVenues(ViewModel):
+    __slots__ = ('city', 'state', 'venues')
+
+class VenueDetail(ViewModel):
+    __slots__ = (
+        'id', 'name', 'genres', 'address', 'city', 'state', 'phone',
+        'website', 'facebook_link', 'seeking_talent', 'seeking_description',
+        'image_link',
+        'past_shows', 'upcoming_shows', 'past_shows_count', 'upcoming_shows_count',
+        'past_shows_pager', 'upcoming_shows_pager'
+    )
+
+#  Artists
+#  ----------------------------------------------------------------
+
+class ArtistSummary(ViewModel):
+    __slots__ = ('id', 'name')
+
+class ArtistDetail(ViewModel):
+    __slots__ = (
+        'id', 'name', 'genres', 'city', 'state', 'phone',
+        'website', 'facebook_link', 'seeking_venue', 'seeking_description',
+        'image_link',
+        'past_shows', 'upcoming_shows', 'past_shows_count', 'upcoming_shows_count',
+        'past_shows_pager', 'upcoming_shows_pager'
+    )
@@ -0,0 +1,41 @@
+#----------------------------------------------------------------------------#
+# Imports.
+#----------------------------------------------------------------------------#
+
+import gc
+from babel import Locale
+from sqlalchemy.orm import configure_mappers
+from app import app
+from forms import ShowForm, VenueForm, ArtistForm
+from conditional import template_digest
+import database
+
+#----------------------------------------------------------------------------#
+# WSGI Entry Point.
+#
+#   gunicorn wsgi:app
+#
+# gunicorn.conf.py imports this once in the master (preload_app), which
+# does every piece of first request work that doesn't touch the database:
+# templates compiled, mappers configured, form fields bound, template
+# digest and locale data loaded. Workers forked from it share those pages
+# copy on write. gc.freeze() keeps the collector from writing to them.
+#----------------------------------------------------------------------------#
+
+FORMS = (ShowForm, VenueForm, ArtistForm)
+
+def preload(app):
+    with app.test_request_context():
+        for name in app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html')):
+            app.jinja_env.get_template(name)
+        template_digest(app)
+        configure_mappers()
+        for form in FORMS:
+            form(meta={'csrf': False})
+        # format_datetime's locale
+        Locale.parse('en')
+    # Connections the master opened aren't inherited by workers
+    database.dispose_engines(app)
+    gc.freeze()
+
+preload(app)